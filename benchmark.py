@@ -0,0 +1,158 @@
+import os
+import sys
+import json
+import argparse
+import kemchi
+import simulator
+
+# benchmark of reference procedures against the simulated rig, no hardware needed.
+# reports simulated wall-clock time, moves per hour, valve switches and serial round trips per
+# workload and compares them with a stored baseline to catch throughput regressions.
+#   python benchmark.py                 # run and compare with benchmark_baseline.json
+#   python benchmark.py --save          # store the current results as the new baseline
+
+PORT_MAP = 'examples/config_files/port_map.yaml'
+CONFIG = 'examples/config_files/config.yaml'
+BASELINE = 'benchmark_baseline.json'
+
+
+# WORKLOADS
+def priming(k):
+    for chemical in ('nahco3', 'nacl', 'water'):
+        k.move_liquid(chemical, 'waste', 0.5, 4)
+
+def multi_stroke(k):
+    k.move_liquid('water', 'reactor1', 2.5*k.SYRINGE_VOL)
+
+def slow_dispense(k):
+    k.slow_dispense('nahco3', 'reactor1', 2, 5)
+
+def partial_dispense(k):
+    k.partial_dispense('water', 'reactor1', 3, 1, 20, 10)
+
+def sample_reactors(k, reactors=('reactor1', 'reactor1', 'reactor1')):
+    # BatchDaisy.sample_reactors pattern
+    for reactor in reactors:
+        k.move_liquid(reactor, 'waste', 0.5, 2)
+        k.move_liquid(reactor, 'sampler', 1)
+        k.move_liquid('air', 'waste', 2)
+        k.move_liquid('air', 'sampler', 1)
+        k.move_liquid('water', 'waste', 2)
+        k.move_liquid('water', 'sampler', 0.5)
+        k.move_liquid('air', 'waste', 2)
+        k.move_liquid('air', 'sampler', 1)
+
+def load_chemicals_to_reactors(k, reactors=('reactor1', 'sampler')):
+    # BatchDaisy.load_chemicals_to_reactors pattern, chemical_step columns of the design table
+    design = {'nahco3_1': [1.5, 0.5], 'nacl_1': [0, 2.0], 'water_1': [4.0, 1.0]}
+    for chemical_name_step, chemical_stock in design.items():
+        chemical_name = chemical_name_step.split('_')[0]
+        k.move_liquid(chemical_name, 'waste', 0.5, 4)
+        for reactor_index, volume in enumerate(chemical_stock):
+            if volume != 0:
+                k.move_liquid(chemical_name, reactors[reactor_index], volume)
+
+def load_chemicals_tracked(k, reactors=('reactor1', 'sampler')):
+    # load_chemicals_to_reactors priming only what the fluid path model finds foreign
+    design = {'nahco3_1': [1.5, 0.5], 'nacl_1': [0, 2.0], 'water_1': [4.0, 1.0]}
+    for chemical_name_step, chemical_stock in design.items():
+        chemical_name = chemical_name_step.split('_')[0]
+        k.ensure_primed(chemical_name)
+        for reactor_index, volume in enumerate(chemical_stock):
+            if volume != 0:
+                k.move_liquid(chemical_name, reactors[reactor_index], volume)
+
+RECIPE = [('water', 0.5), ('nahco3', 1.0), ('nacl', 0.3), ('water', 0.2)]
+
+def recipe_moves(k, reactors=('reactor1', 'sampler')):
+    # a small multi-reagent recipe, one move_liquid per reagent
+    for reactor in reactors:
+        for source, volume in RECIPE:
+            k.move_liquid(source, reactor, volume)
+
+def recipe_composed(k, reactors=('reactor1', 'sampler')):
+    # the same recipe stacked in the syringe and delivered in one dispense
+    for reactor in reactors:
+        k.compose(reactor, RECIPE)
+
+WORKLOADS = {'priming': priming,
+             'multi_stroke': multi_stroke,
+             'slow_dispense': slow_dispense,
+             'partial_dispense': partial_dispense,
+             'sample_reactors': sample_reactors,
+             'load_chemicals_to_reactors': load_chemicals_to_reactors,
+             'load_chemicals_tracked': load_chemicals_tracked,
+             'recipe_moves': recipe_moves,
+             'recipe_composed': recipe_composed}
+
+
+# HARNESS
+def run_workload(workload, port_map_path=PORT_MAP, config_path=CONFIG):
+    rig = simulator.SimulatedRig(config_path)
+    k = kemchi.DaisyChain(port_map_path, config_path, verbose=False, transport=rig.open_port, clock=rig.clock)
+    k.initialize_daisy_chain()
+    start = rig.stats()
+    k.instrumentation.reset()
+    workload(k)
+    end = rig.stats()
+    seconds = end['simulated_time'] - start['simulated_time']
+    moves = sum(total['count'] for total in k.instrumentation.totals['route'].values())
+    return {'seconds': round(seconds, 2),
+            'moves': moves,
+            'moves_per_hour': round(moves*3600/seconds, 1) if seconds else 0.0,
+            'valve_switches': end['valve_rotations'] - start['valve_rotations'],
+            'round_trips': end['packets'] - start['packets']}
+
+def run(names=None, port_map_path=PORT_MAP, config_path=CONFIG):
+    return {name: run_workload(WORKLOADS[name], port_map_path, config_path) for name in (names or WORKLOADS)}
+
+def compare(results, baseline, tolerance=0.02):
+    '''
+        returns the regressions: workloads slower than the baseline by more than the tolerance
+    '''
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        reference = baseline[name]
+        if result['seconds'] > reference['seconds']*(1 + tolerance):
+            regressions.append(f"{name}: {reference['seconds']}s -> {result['seconds']}s")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='kemchi throughput benchmark on the simulated rig')
+    parser.add_argument('workloads', nargs='*', help=f'subset of {list(WORKLOADS)}')
+    parser.add_argument('--config', default=CONFIG)
+    parser.add_argument('--port-map', default=PORT_MAP)
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--tolerance', type=float, default=0.02, help='allowed relative slowdown')
+    parser.add_argument('--save', action='store_true', help='store the results as the new baseline')
+    args = parser.parse_args(argv)
+
+    os.makedirs('logs', exist_ok=True) # DaisyChain logs to logs/
+    results = run(args.workloads, args.port_map, args.config)
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r') as file:
+            baseline = json.load(file)
+
+    print(f"{'workload':<28}{'time [s]':>10}{'baseline':>10}{'moves/h':>10}{'switches':>10}{'round trips':>13}")
+    for name, result in results.items():
+        reference = baseline.get(name, {}).get('seconds', '-')
+        print(f"{name:<28}{result['seconds']:>10}{reference:>10}{result['moves_per_hour']:>10}"
+              f"{result['valve_switches']:>10}{result['round_trips']:>13}")
+
+    if args.save:
+        baseline.update(results)
+        with open(args.baseline, 'w') as file:
+            json.dump(baseline, file, indent=2)
+        print(f'baseline saved to {args.baseline}')
+        return 0
+    regressions = compare(results, baseline, args.tolerance)
+    for regression in regressions:
+        print(f'REGRESSION {regression}')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,253 @@
+import csv
+import numpy as np
+from constants import MAX_STEPS
+
+# streaming campaign runner for experiment design tables too large to handle in a notebook loop.
+# the design table (csv or parquet) has one row per experiment: a reactor column naming the sink node
+# and chemical_step columns with the volume in ml to add, blank or 0 for nothing. rows are streamed in
+# chunks, never loaded all at once.
+# usage:
+#   campaign = k0.campaign('designs/screen.csv', exclude=['experiment'])
+#   campaign.validate() # the whole table is checked before anything moves
+#   campaign.estimate() # s, dry run on the virtual clock
+#   campaign.run() # progress, rate and ETA go to the log (and stdout when verbose)
+#
+# rows are executed in batches of consecutive rows with distinct reactors, like the BatchDaisy helpers:
+# per chemical_step column (in table order) the chemical is primed once, then added to every reactor of
+# the batch. a reactor appearing again starts a new batch, so its additions keep their row order.
+
+ERROR_LIMIT = 20 # validation errors listed in the exception
+
+
+class Campaign:
+
+    def __init__(self, chain, path, reactor_column='reactor', exclude=(), chunk_rows=1000, batch_rows=None,
+                 progress_interval=60):
+        self.chain = chain
+        self.path = path
+        self.reactor_column = reactor_column
+        self.exclude = set(exclude) # columns or chemicals of the table that are not liquid additions
+        self.chunk_rows = chunk_rows
+        self.batch_rows = batch_rows # largest batch, unlimited by default
+        self.progress_interval = progress_interval # s of chain clock between progress reports
+        self.report = None
+        self.done = {'rows': 0, 'moves': 0, 'strokes': 0}
+        self.start = None
+        self.last_progress = None
+
+    # READING
+    def read_header(self):
+        if str(self.path).endswith('.parquet'):
+            import pyarrow.parquet # optional, only needed for parquet designs
+            return list(pyarrow.parquet.ParquetFile(self.path).schema_arrow.names)
+        with open(self.path, 'r', newline='') as file:
+            return next(csv.reader(file))
+
+    def step_columns(self, header):
+        # chemical_step columns carrying volumes, in table order
+        return [column for column in header if column != self.reactor_column
+                and column not in self.exclude and column.split('_')[0] not in self.exclude]
+
+    def chunks(self):
+        '''
+            yields (first row index, reactors, volumes) per chunk of rows, volumes is a rows x step columns array
+        '''
+        header = self.read_header()
+        columns = self.step_columns(header)
+        if str(self.path).endswith('.parquet'):
+            import pyarrow.parquet
+            offset = 0
+            for batch in pyarrow.parquet.ParquetFile(self.path).iter_batches(batch_size=self.chunk_rows,
+                                                                            columns=[self.reactor_column] + columns):
+                reactors = np.array(batch.column(self.reactor_column).to_pylist(), dtype=str)
+                volumes = np.column_stack([batch.column(column).to_numpy(zero_copy_only=False).astype(float)
+                                           for column in columns]) if columns else np.zeros((len(reactors), 0))
+                yield offset, reactors, np.nan_to_num(volumes, nan=0.0) # nulls add nothing
+                offset += len(reactors)
+            return
+        reactor_index = header.index(self.reactor_column)
+        indices = [header.index(column) for column in columns]
+        with open(self.path, 'r', newline='') as file:
+            reader = csv.reader(file)
+            next(reader)
+            offset = 0
+            while True:
+                rows = [row for _, row in zip(range(self.chunk_rows), reader)]
+                if not rows:
+                    return
+                try:
+                    table = np.array(rows, dtype=str)
+                    cells = table[:, indices]
+                    cells[np.char.strip(cells) == ''] = '0'
+                    volumes = cells.astype(float)
+                except ValueError as error:
+                    raise Exception(f'Campaign {self.path}: rows {offset}-{offset + len(rows) - 1}: {error}')
+                yield offset, table[:, reactor_index], volumes
+                offset += len(rows)
+
+    # VALIDATION
+    def validate(self):
+        '''
+            checks the whole design table before anything moves: nodes in port_map.yaml, volumes that are
+            finite, non-negative and above the syringe resolution, and the total added to every reactor by
+            all of its rows within its capacity (capacity in ml on the node in port_map.yaml).
+            returns a report with the rows, moves, strokes and volume per chemical
+        '''
+        port_map = self.chain.port_map
+        header = self.read_header()
+        errors = []
+        if self.reactor_column not in header:
+            raise Exception(f'Campaign {self.path}: no {self.reactor_column} column')
+        columns = self.step_columns(header)
+        chemicals = [column.split('_')[0] for column in columns]
+        for column, chemical in zip(columns, chemicals):
+            if chemical not in port_map:
+                errors.append(f'{column}: chemical {chemical} not added to port_map.yaml configuration file')
+        resolution = self.chain.SYRINGE_VOL/MAX_STEPS
+        rows = moves = strokes = 0
+        volume = np.zeros(len(columns))
+        filled = {} # reactor -> ml added by the rows so far
+        overfilled = {} # reactor -> first row over its capacity
+        for offset, reactors, volumes in self.chunks():
+            nodes, inverse = np.unique(reactors, return_inverse=True)
+            for node in nodes:
+                if node not in port_map:
+                    errors.append(f"rows {(offset + np.flatnonzero(reactors == node)[:5]).tolist()}: "
+                                  f'reactor {node} not added to port_map.yaml configuration file')
+            for row, x in np.argwhere(~np.isfinite(volumes) | (volumes < 0)):
+                errors.append(f'row {offset + row}, {columns[x]}: invalid volume {volumes[row, x]}')
+            for row, x in np.argwhere((volumes > 0) & (volumes < resolution)):
+                errors.append(f'row {offset + row}, {columns[x]}: {volumes[row, x]} ml below the syringe '
+                              f'resolution of {resolution} ml')
+            finite = np.where(np.isfinite(volumes), volumes, 0)
+            # nothing empties a reactor between its rows, the additions of every row count towards its capacity
+            added = np.bincount(inverse.ravel(), weights=finite.sum(axis=1), minlength=len(nodes))
+            for x, node in enumerate(nodes):
+                capacity = self.chain.capacities.get(node, np.inf)
+                if node in overfilled or filled.get(node, 0.0) + added[x] <= capacity:
+                    filled[node] = filled.get(node, 0.0) + added[x]
+                    continue
+                rows_of_node = np.flatnonzero(inverse.ravel() == x)
+                running = filled.get(node, 0.0) + np.cumsum(finite[rows_of_node].sum(axis=1))
+                overfilled[node] = offset + int(rows_of_node[np.argmax(running > capacity)])
+                filled[node] = running[-1]
+            # transfers larger than the syringe are split into equal strokes, as in move_liquid
+            steps = np.floor(MAX_STEPS*finite/self.chain.SYRINGE_VOL)
+            rows += len(reactors)
+            moves += int(np.count_nonzero(volumes > 0))
+            strokes += int(np.ceil(steps/MAX_STEPS).sum())
+            volume += finite.sum(axis=0)
+        for node, row in overfilled.items():
+            errors.append(f'row {row}: {node} filled over its {self.chain.capacities[node]} ml capacity, '
+                          f'{round(filled[node], 6)} ml added by the whole table')
+        if errors:
+            listed = '\n'.join(errors[:ERROR_LIMIT])
+            raise Exception(f'Campaign {self.path}: {len(errors)} errors in the design table\n{listed}')
+        totals = {}
+        for chemical, amount in zip(chemicals, volume):
+            totals[chemical] = round(totals.get(chemical, 0.0) + float(amount), 6)
+        self.report = {'rows': rows, 'moves': moves, 'strokes': strokes, 'volumes': totals}
+        self.chain.logger.info(f'campaign {self.path}: {self.report}')
+        if self.chain.verbose:
+            print(f'{self.chain.tstamp()} campaign check: {rows} rows, {moves} moves, {strokes} strokes, appears ok')
+        return self.report
+
+    # EXECUTION
+    def batches(self):
+        '''
+            yields (first row index, reactors, volumes) per batch of consecutive rows with distinct reactors
+        '''
+        batch = []
+        reactors_in_batch = set()
+        for offset, reactors, volumes in self.chunks():
+            for x, reactor in enumerate(reactors):
+                if reactor in reactors_in_batch or len(batch) == self.batch_rows:
+                    yield batch[0][0], [row[1] for row in batch], np.array([row[2] for row in batch])
+                    batch = []
+                    reactors_in_batch = set()
+                batch.append((offset + x, reactor, volumes[x]))
+                reactors_in_batch.add(reactor)
+        if batch:
+            yield batch[0][0], [row[1] for row in batch], np.array([row[2] for row in batch])
+        return
+
+    def operations(self):
+        '''
+            lazily yields the operations of the campaign, {'kind': 'prime', 'source'},
+            {'kind': 'move_liquid', 'source', 'sink', 'volume', 'row'} and {'kind': 'rows', 'rows'} after every batch
+        '''
+        columns = self.step_columns(self.read_header())
+        for first, reactors, volumes in self.batches():
+            for x, column in enumerate(columns):
+                chemical = column.split('_')[0]
+                rows = np.flatnonzero(volumes[:, x] > 0)
+                if len(rows) == 0:
+                    continue
+                yield {'kind': 'prime', 'source': chemical}
+                for row in rows:
+                    yield {'kind': 'move_liquid', 'source': chemical, 'sink': str(reactors[row]),
+                           'volume': float(volumes[row, x]), 'row': first + int(row)}
+            yield {'kind': 'rows', 'rows': len(reactors)}
+        return
+
+    def execute(self):
+        for op in self.operations():
+            if op['kind'] == 'prime':
+                self.chain.ensure_primed(op['source'])
+            elif op['kind'] == 'move_liquid':
+                self.chain.move_liquid(op['source'], op['sink'], op['volume'])
+                self.done['moves'] += 1
+                self.done['strokes'] += self.chain.stroke_split(op['volume'])[0]
+            else:
+                self.done['rows'] += op['rows']
+            if self.chain.clock.monotonic() - self.last_progress >= self.progress_interval:
+                self.report_progress()
+        return
+
+    def run(self):
+        '''
+            validates the table unless done already and executes it row batch by row batch
+        '''
+        if self.report is None:
+            self.validate()
+        self.done = {'rows': 0, 'moves': 0, 'strokes': 0}
+        self.start = self.last_progress = self.chain.clock.monotonic()
+        self.execute()
+        self.report_progress()
+        return
+
+    def estimate(self):
+        '''
+            predicted duration in s from a dry run of the whole campaign
+        '''
+        if self.report is None:
+            self.validate()
+        done, start, last_progress = self.done, self.start, self.last_progress
+        with self.chain.dry_run() as estimate:
+            self.done = {'rows': 0, 'moves': 0, 'strokes': 0}
+            self.start = self.last_progress = self.chain.clock.monotonic()
+            self.execute()
+        self.done, self.start, self.last_progress = done, start, last_progress
+        return estimate.total
+
+    # PROGRESS
+    def progress(self):
+        '''
+            rows, moves and strokes done, rate in moves/h and ETA in s from the strokes left
+        '''
+        elapsed = self.chain.clock.monotonic() - self.start
+        progress = dict(self.done, elapsed=round(elapsed, 1), rate=None, eta=None)
+        if elapsed > 0 and self.done['strokes'] > 0:
+            progress['rate'] = round(self.done['moves']/elapsed*3600, 1)
+            progress['eta'] = round((self.report['strokes'] - self.done['strokes'])*elapsed/self.done['strokes'], 1)
+        return progress
+
+    def report_progress(self):
+        self.last_progress = self.chain.clock.monotonic()
+        progress = self.progress()
+        self.chain.logger.info(f'campaign {self.path}: {progress}')
+        if self.chain.verbose:
+            eta = '-' if progress['eta'] is None else f"{round(progress['eta']/60, 1)} min"
+            print(f"{self.chain.tstamp()} campaign: {progress['rows']}/{self.report['rows']} rows, "
+                  f"{progress['moves']}/{self.report['moves']} moves, {progress['rate']} moves/h, ETA {eta}")
+        return
@@ -72,4 +72,16 @@ WARNING_CODE = {#b'a': 'Syringe not initialized, ready',
 CRITICAL_CODE = {b'z': 'Syringe may crash, ready',
                  b'Z': 'Syringe may crash, busy',
                  b'a': 'Syringe not initialized, ready',
-                 b'A': 'Syringe not initialized, busy',}
\ No newline at end of file
+                 b'A': 'Syringe not initialized, busy',}
+
+# status codes reported while the device is still executing a command
+BUSY_CODE = {code for codes in (OK_CODE, WARNING_CODE, CRITICAL_CODE) for code, status in codes.items() if status.endswith('busy')}
+
+# status codes after which the valve position can not be trusted
+VALVE_ERROR_CODE = {b'j', b'J', b'x', b'X'}
+
+# the plunger stalled on back pressure, the move was not completed
+OVERLOAD_CODE = {b'i', b'I'}
+
+# the device lost its initialization (power cycle) and has to be homed again
+NOT_INITIALIZED_CODE = {b'a', b'A', b'g', b'G'}
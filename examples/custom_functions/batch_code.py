@@ -3,7 +3,7 @@
 # TODO: test example funcs and potential inheritance bugs, check the utility of a new class vs external func
 
 from kemchi import DaisyChain
-import time
+import numpy as np
 
 class BatchDaisy(DaisyChain):
     # TODO: custom function, to be move out to examples
@@ -11,9 +11,9 @@ class BatchDaisy(DaisyChain):
         for chemical_name_step in STEP:
             if np.any(exp_subset[chemical_name_step]):
                 chemical_name = chemical_name_step.split('_')[0]
-                # PRIME CHEMICAL
+                # PRIME CHEMICAL, only the dead volume holding other liquids is purged
                 #print(f'priming {chemical_name}')
-                self.move_liquid(chemical_name, 'waste', 0.5, 4)
+                self.ensure_primed(chemical_name)
                 chemical_stock = list(exp_subset[chemical_name_step])
                 for reactor_index, volume in enumerate(chemical_stock):
                     if volume != 0:
@@ -24,7 +24,7 @@ class BatchDaisy(DaisyChain):
     # TODO: custom function, to be move out to examples
     def sample_reactors(self, reactors, count):
         for i in range(count):
-            self.move_liquid(reactors[i], 'waste', 0.5, 2) # TODO: needs to account for the dead volume of tube
+            self.ensure_primed(reactors[i]) # purges the dead volume of the reactor line
             self.move_liquid(reactors[i], 'sampler', 1)
             self.move_liquid('air', 'waste', 2)
             self.move_liquid('air', 'sampler', 1)
@@ -33,11 +33,12 @@ class BatchDaisy(DaisyChain):
             self.move_liquid('air', 'waste', 2)
             self.move_liquid('air', 'sampler', 1)
             self.sampler_next()
-            time.sleep(1)
+            self.clock.sleep(1)
         return
 
     # TODO: created as a custom function, to be move out to examples
     def check_chem_ports(self, df, exclude_list):
+        # for whole design files prefer self.campaign(path).validate(), which also checks reactors and volumes
         ports = self.port_map.keys()
         chems_steps = df.columns
         for chem_step in chems_steps:
@@ -45,6 +46,8 @@ class BatchDaisy(DaisyChain):
             if chem not in ports and chem not in exclude_list:
                 raise Exception(f'Chemical {chem} not added to port_map.yaml configuration file!')
             elif chem not in exclude_list:
-                print(f'{chem_step}: {chem}: {port_map[chem]} OK')
-        print('Chem port check result: appears ok')
-        return
\ No newline at end of file
+                self.logger.info(f'{chem_step}: {chem}: {self.port_map[chem]} OK')
+        self.logger.info('Chem port check result: appears ok')
+        if self.verbose == True:
+            print(f'{self.tstamp()} chem port check result: appears ok')
+        return
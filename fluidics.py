@@ -0,0 +1,138 @@
+import copy
+
+# fluid path model: which liquid last occupied every tubing segment and the syringe, so priming and
+# washing only purge what is actually foreign. plug flow along the tubing, the syringe is well mixed.
+# segments are the line of every node (valve port to the node) and the links between the valves:
+# link1 runs from port 1 of the pump valve to the next valve, link2 on from there and so on.
+# port address '114' routes the syringe through link1 and link2 into the line of its node.
+# None marks liquid of unknown origin, every segment starts out unknown.
+
+EPSILON = 1e-9 # ml, rounding left over from splitting plugs
+
+
+class FluidPath:
+
+    def __init__(self, port_map, dead_volumes=None, line_volume=0.2, link_volume=0.1, syringe_residual=0.0):
+        self.port_map = port_map
+        self.nodes = {address: node for node, address in port_map.items()}
+        self.volumes = {} # segment -> dead volume in ml
+        for node in port_map:
+            self.volumes[node] = (dead_volumes or {}).get(node, line_volume)
+        for n in range(1, max([len(address) for address in port_map.values()], default=1)):
+            self.volumes[f'link{n}'] = link_volume
+        # plugs [composition, ml] ordered from the syringe side outwards, composition maps liquid -> fraction
+        self.segments = {segment: [[{None: 1.0}, volume]] for segment, volume in self.volumes.items() if volume > 0}
+        self.syringe_residual = syringe_residual
+        self.syringe = {None: syringe_residual} if syringe_residual > 0 else {} # liquid -> ml
+        self.paths = {}
+
+    def copy(self):
+        # compositions are never modified, only the plug lists and the syringe are copied
+        model = copy.copy(self)
+        model.segments = {segment: [list(plug) for plug in plugs] for segment, plugs in self.segments.items()}
+        model.syringe = dict(self.syringe)
+        return model
+
+    def path(self, address):
+        '''
+            segments between the syringe and the port address, syringe side first
+        '''
+        if address not in self.paths:
+            segments = [f'link{n}' for n in range(1, len(address))]
+            if address in self.nodes:
+                segments.append(self.nodes[address])
+            self.paths[address] = [segment for segment in segments if segment in self.segments]
+        return self.paths[address]
+
+    # FLOW
+    def take(self, plugs, volume, from_start):
+        # removes volume from one end of the plug list and returns it as plugs
+        taken = []
+        end = 0 if from_start else -1
+        while volume > EPSILON and plugs:
+            plug = plugs[end]
+            if plug[1] <= volume + EPSILON:
+                taken.append(plugs.pop(end))
+                volume -= plug[1]
+                continue
+            taken.append([plug[0], volume])
+            plug[1] -= volume
+            volume = 0.0
+        return taken if from_start else taken[::-1]
+
+    def join(self, plugs, incoming, at_start):
+        # neighbouring plugs of the same composition are merged, compositions are shared, never modified
+        for plug in (incoming[::-1] if at_start else incoming):
+            end = 0 if at_start else -1
+            if plugs and plugs[end][0] == plug[0]:
+                plugs[end] = [plug[0], plugs[end][1] + plug[1]]
+            elif at_start:
+                plugs.insert(0, plug)
+            else:
+                plugs.append(plug)
+        return
+
+    def aspirate(self, address, volume):
+        # liquid of the node enters at the far end, every segment pushes its syringe end onwards
+        incoming = [[{self.nodes.get(address): 1.0}, volume]]
+        for segment in reversed(self.path(address)):
+            plugs = self.segments[segment]
+            self.join(plugs, incoming, at_start=False)
+            incoming = self.take(plugs, volume, from_start=True)
+        for composition, amount in incoming:
+            for liquid, fraction in composition.items():
+                self.syringe[liquid] = self.syringe.get(liquid, 0.0) + amount*fraction
+        return
+
+    def dispense(self, address, volume):
+        # the well mixed syringe content leaves in proportion to its composition
+        total = sum(self.syringe.values())
+        outgoing = []
+        if total > EPSILON:
+            blend = min(volume, total)
+            outgoing.append([{liquid: amount/total for liquid, amount in self.syringe.items()}, blend])
+            self.syringe = {liquid: amount*(1 - blend/total) for liquid, amount in self.syringe.items()
+                            if amount*(1 - blend/total) > EPSILON}
+        if volume - total > EPSILON:
+            outgoing.append([{None: 1.0}, volume - max(total, 0.0)]) # more than the model holds
+        for segment in self.path(address):
+            plugs = self.segments[segment]
+            self.join(plugs, outgoing, at_start=True)
+            outgoing = self.take(plugs, volume, from_start=False)
+        return
+
+    # STATE
+    def foreign(self, segments, liquids):
+        '''
+            volume in the segments that is not one of the liquids
+        '''
+        return sum(amount*fraction for segment in segments for composition, amount in self.segments[segment]
+                   for liquid, fraction in composition.items() if liquid not in liquids)
+
+    def impurity(self, segments, liquids):
+        '''
+            highest fraction of a segment that is not one of the liquids. segments shared by the aspirate and
+            dispense route hold the syringe blend after every stroke, so purging only dilutes them
+        '''
+        return max([self.foreign([segment], liquids)/self.volumes[segment] for segment in segments], default=0.0)
+
+    def contamination(self, liquids):
+        '''
+            fraction of the syringe content that is not one of the liquids
+        '''
+        total = sum(self.syringe.values())
+        if total <= EPSILON:
+            return 0.0
+        return sum(amount for liquid, amount in self.syringe.items() if liquid not in liquids)/total
+
+    def contents(self):
+        # the liquid making up most of every segment and the syringe
+        contents = {}
+        for segment, plugs in self.segments.items():
+            volumes = {}
+            for composition, amount in plugs:
+                for liquid, fraction in composition.items():
+                    volumes[liquid] = volumes.get(liquid, 0.0) + amount*fraction
+            contents[segment] = max(volumes, key=volumes.get)
+        contents['syringe'] = max(self.syringe, key=self.syringe.get) if self.syringe else 'empty'
+        return contents
@@ -0,0 +1,86 @@
+import re
+from constants import OK_CODE, WARNING_CODE, CRITICAL_CODE, BUSY_CODE
+
+# framed status reads: the devices answer with /0<status>\x03\r\n frames. FrameReader returns as
+# soon as a frame terminator arrives instead of waiting out the read timeout like readlines().
+
+TERMINATOR = b'\x03\r\n'
+FRAME_PATTERN = re.compile(rb'/0(.*?)\x03\r\n')
+
+
+class DeviceStatus:
+    '''
+        parsed status frame, level is 'ok', 'warning', 'critical', 'unknown' or 'missing' (no response)
+    '''
+    __slots__ = ('code', 'description', 'level', 'busy')
+
+    def __init__(self, code, description, level, busy):
+        self.code = code
+        self.description = description
+        self.level = level
+        self.busy = busy
+
+    @property
+    def ready(self):
+        return not self.busy and self.level in ('ok', 'warning')
+
+    def __repr__(self):
+        return f'DeviceStatus({self.code!r}, {self.description!r}, {self.level}, busy={self.busy})'
+
+
+NO_RESPONSE = DeviceStatus(None, 'No response', 'missing', False)
+STATUS = {}
+for level, codes in (('ok', OK_CODE), ('warning', WARNING_CODE), ('critical', CRITICAL_CODE)):
+    for code, description in codes.items():
+        STATUS[code] = DeviceStatus(code, description, level, code in BUSY_CODE)
+
+
+def parse_status(code):
+    if code is None:
+        return NO_RESPONSE
+    if code not in STATUS:
+        STATUS[code] = DeviceStatus(code, f'unknwon response code - {code}', 'unknown', False)
+    return STATUS[code]
+
+
+class FrameReader:
+    '''
+        reads status frames from one port into a reused buffer.
+        drain() collects replies to earlier commands without blocking, read_frame() then waits
+        for exactly one more frame and returns the codes of all complete frames in order
+    '''
+    def __init__(self, port):
+        self.port = port
+        self.buffer = bytearray()
+        self.codes = []
+
+    def take(self):
+        codes = [match.group(1) for match in FRAME_PATTERN.finditer(self.buffer)]
+        # everything up to the last terminator is consumed, including malformed frames
+        cut = self.buffer.rfind(TERMINATOR)
+        if cut >= 0:
+            del self.buffer[:cut + len(TERMINATOR)]
+        return codes
+
+    def drain(self):
+        waiting = self.port.in_waiting
+        if waiting:
+            self.buffer += self.port.read(waiting)
+        self.codes = self.take()
+        return
+
+    def read_frame(self):
+        if TERMINATOR not in self.buffer:
+            self.buffer += self.port.read_until(TERMINATOR)
+        return self.codes + self.take()
+
+    async def aread_frame(self, asleep, clock, interval=0.002):
+        timeout = getattr(self.port, 'timeout', 0.1)
+        start = clock.monotonic()
+        while TERMINATOR not in self.buffer and clock.monotonic() - start < timeout:
+            waiting = self.port.in_waiting
+            if waiting:
+                self.buffer += self.port.read(waiting)
+            else:
+                await asleep(interval)
+        return self.codes + self.take()
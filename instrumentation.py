@@ -0,0 +1,191 @@
+import json
+
+# timing instrumentation: every operation and its sub-steps (valve actuation, aspirate, dispense,
+# speed setting, interrogation) become nested spans. the time of a span is split into
+#   wire    - serial round trips waiting for replies
+#   busy    - the device executing the command (measured in poll mode, estimated in sleep mode)
+#   padding - everything else, fixed sleeps beyond the device time
+# closed spans are emitted as events to the sinks (e.g. JsonlSink) and aggregated for summary().
+# usage:
+#   k0.instrumentation.add_sink(JsonlSink('logs/events.jsonl'))
+#   k0.move_liquid('water', 'reactor1', 5)
+#   k0.instrumentation.report()
+
+
+class JsonlSink:
+    '''
+        appends every event as one json line
+    '''
+    def __init__(self, path):
+        self.file = open(path, 'a')
+
+    def __call__(self, event):
+        self.file.write(json.dumps(event) + '\n')
+        self.file.flush()
+        return
+
+    def close(self):
+        self.file.close()
+        return
+
+
+class MemorySink:
+    def __init__(self):
+        self.events = []
+
+    def __call__(self, event):
+        self.events.append(event)
+        return
+
+
+class Span:
+    __slots__ = ('name', 'fields', 'start', 'wire', 'busy', 'depth', 'counts')
+
+    def __init__(self, name, fields, start, depth):
+        self.name = name
+        self.fields = fields
+        self.start = start
+        self.wire = 0.0
+        self.busy = 0.0
+        self.depth = depth
+        self.counts = {}
+
+
+class Instrumentation:
+
+    def __init__(self, clock, sinks=(), sink_depth=None, summarize=True):
+        self.clock = clock
+        self.sinks = list(sinks)
+        self.sink_depth = sink_depth # deeper spans are only aggregated, not emitted
+        self.summarize = summarize # aggregate the spans for summary()
+        self.untracked = Span(None, {}, 0.0, None) # stands in for spans that are neither emitted nor aggregated
+        self.untracked_depth = sink_depth if not summarize else None # deeper spans are not opened at all
+        self.stack = []
+        self.wire_total = 0.0
+        self.busy_total = 0.0
+        self.counts = {} # event counters over all spans
+        self.reset()
+
+    def add_sink(self, sink):
+        self.sinks.append(sink)
+        return
+
+    def reset(self):
+        '''
+            starts a new procedure for summary()
+        '''
+        self.totals = {'step': {}, 'route': {}, 'node': {}, 'device': {}}
+        self.procedure_start = self.clock.monotonic()
+        return
+
+    # SPANS
+    def start(self, name, **fields):
+        if self.untracked_depth is not None and len(self.stack) > self.untracked_depth:
+            return self.untracked
+        span = Span(name, fields, self.clock.monotonic(), len(self.stack))
+        self.stack.append(span)
+        return span
+
+    def end(self, span, error=None):
+        if span is self.untracked:
+            return
+        # spans left open by an error inside the step are closed with it
+        while self.stack:
+            inner = self.stack.pop()
+            self.close(inner, error)
+            if inner is span:
+                break
+        return
+
+    def wire(self, seconds):
+        self.wire_total += seconds
+        for span in self.stack:
+            span.wire += seconds
+        return
+
+    def busy(self, seconds):
+        self.busy_total += seconds
+        for span in self.stack:
+            span.busy += seconds
+        return
+
+    def count(self, name, n=1):
+        # event counters like strokes or valve switches
+        self.counts[name] = self.counts.get(name, 0) + n
+        for span in self.stack:
+            span.counts[name] = span.counts.get(name, 0) + n
+        return
+
+    def close(self, span, error=None):
+        emit = self.sinks and (self.sink_depth is None or span.depth <= self.sink_depth)
+        if not emit and not self.summarize:
+            return
+        end = self.clock.monotonic()
+        duration = end - span.start
+        busy = min(span.busy, duration - span.wire)
+        times = {'duration': duration, 'wire': span.wire, 'busy': busy,
+                 'padding': max(duration - span.wire - busy, 0.0)}
+        if self.summarize:
+            self.aggregate(span, times)
+        if not emit:
+            return
+        event = {'event': 'span', 'name': span.name, 'depth': span.depth, 'start': span.start, 'end': end}
+        event.update(times)
+        event.update(span.counts)
+        event.update(span.fields)
+        if error is not None:
+            event['error'] = str(error)
+        for sink in self.sinks:
+            sink(event)
+        return
+
+    # SUMMARY
+    def add(self, group, key, times):
+        total = self.totals[group].setdefault(key, {'count': 0, 'duration': 0.0, 'wire': 0.0, 'busy': 0.0, 'padding': 0.0})
+        total['count'] += 1
+        for name, seconds in times.items():
+            total[name] += seconds
+        return
+
+    def aggregate(self, span, times):
+        self.add('step', span.name, times)
+        # a device counts once, the interrogations inside its aspirate or dispense span are part of it
+        if 'device' in span.fields and not any('device' in outer.fields for outer in self.stack):
+            self.add('device', f"v{span.fields['device']}", times)
+        if span.depth > 0:
+            return
+        # operations count towards their route and every node they touch
+        if 'source' in span.fields and 'sink' in span.fields:
+            self.add('route', f"{span.fields['source']}->{span.fields['sink']}", times)
+        for key in ('source', 'sink', 'node'):
+            if isinstance(span.fields.get(key), str):
+                self.add('node', span.fields[key], times)
+        # a recipe of (source, volume) pairs delivered together, see DaisyChain.compose()
+        if isinstance(span.fields.get('recipe'), list) and 'sink' in span.fields:
+            sources = list(dict.fromkeys(source for source, volume in span.fields['recipe']))
+            self.add('route', f"{'+'.join(sources)}->{span.fields['sink']}", times)
+            for source in sources:
+                self.add('node', source, times)
+        return
+
+    def summary(self, top=5):
+        '''
+            top time sinks of the procedure by step, route, node and device
+        '''
+        summary = {'elapsed': self.clock.monotonic() - self.procedure_start}
+        for group, totals in self.totals.items():
+            ranked = sorted(totals.items(), key=lambda item: item[1]['duration'], reverse=True)
+            summary[group] = dict(ranked[:top])
+        return summary
+
+    def report(self, top=5):
+        summary = self.summary(top)
+        for sink in self.sinks:
+            sink(dict(summary, event='summary'))
+        print(f"elapsed {round(summary['elapsed'], 1)}s")
+        for group in ('step', 'route', 'node', 'device'):
+            print(f'top {group}s:')
+            for key, total in summary[group].items():
+                print(f"    {key}: {round(total['duration'], 1)}s in {total['count']} "
+                      f"(wire {round(total['wire'], 1)}s, busy {round(total['busy'], 1)}s, padding {round(total['padding'], 1)}s)")
+        return summary
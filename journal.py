@@ -0,0 +1,70 @@
+import os
+import json
+
+# crash-safe operation journal: every record is one json line, flushed and fsync'd before the next
+# hardware command, so the journal survives a STALL, a usb drop, a kernel restart or a power loss.
+# a procedure run appends
+#   {'event': 'session'}                                    - first operation of a new run
+#   {'event': 'operation', 'operation': 3, 'name': 'move_liquid', 'fields': {...}}
+#   {'event': 'step', 'operation': 3, 'step': 1, 'route': '2', 'volume': 0.5, 'vstate': [...], 'plunger': 1200}
+#   {'event': 'compiled', 'operation': 3, 'strokes': 4}    - firmware loop sent, its progress is not observable
+#   {'event': 'done', 'operation': 3}
+# steps are the completed plunger moves, volume is positive for aspirating and negative for dispensing.
+# usage, after the crash:
+#   k0 = kemchi.DaisyChain('config_files/port_map.yaml','config_files/config.yaml') # journal set in config.yaml
+#   k0.resume()
+#   ... the same procedure again, finished operations and pump moves are skipped
+
+
+class Journal:
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'a')
+
+    def append(self, record):
+        self.file.write(json.dumps(record) + '\n')
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        return
+
+    def close(self):
+        self.file.close()
+        return
+
+
+def read_session(path):
+    '''
+        records of the last session in the journal, a line cut short by the crash is dropped
+    '''
+    records = []
+    with open(path, 'r') as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if record.get('event') == 'session':
+                records = []
+            records.append(record)
+    return records
+
+
+def journaled_operations(records):
+    '''
+        operation index -> {'name', 'fields', 'done', 'compiled', 'steps'} from the records of a session,
+        steps are the step records in order, a resumed operation continues the steps of its earlier attempt
+    '''
+    summary = {}
+    for record in records:
+        if record['event'] == 'operation':
+            summary.setdefault(record['operation'], {'name': record['name'], 'fields': record['fields'],
+                                                     'done': False, 'compiled': False, 'steps': []})
+        elif record['event'] == 'step':
+            summary[record['operation']]['steps'].append(record)
+            summary[record['operation']]['compiled'] = False
+        elif record['event'] == 'compiled':
+            summary[record['operation']]['compiled'] = True
+        elif record['event'] == 'done':
+            summary[record['operation']]['done'] = True
+    return summary
@@ -1,3 +1,4 @@
+import os
 import serial
 import time
 import math
@@ -6,11 +7,86 @@ import numpy as np
 from datetime import datetime #, timedelta
 import yaml
 import logging
-from constants import MAX_STEPS, OK_CODE, WARNING_CODE, CRITICAL_CODE #TODO rewrite to match modules in packages
-import re
+from constants import MAX_STEPS, OK_CODE, WARNING_CODE, CRITICAL_CODE, BUSY_CODE, VALVE_ERROR_CODE, OVERLOAD_CODE, NOT_INITIALIZED_CODE #TODO rewrite to match modules in packages
+import json
+import asyncio
+import inspect
+from contextlib import contextmanager
+from planner import Plan
+from campaign import Campaign
+from framing import FrameReader, FRAME_PATTERN, parse_status
+from instrumentation import Instrumentation, JsonlSink
+from simulator import VirtualClock, NullPort
+from fluidics import FluidPath
+from journal import Journal, read_session, journaled_operations
+from traffic import TrafficRecorder
 
 
 
+# the hardware operations of DaisyChain are generators yielding either a sleep duration in seconds
+# or a port to read the pending response lines from (the lines are sent back into the generator).
+# blocking() and awaitable() turn them into the synchronous methods and their asyncio variants.
+def span_fields(parameters, args, kwargs):
+    # call arguments of an operation recorded with its span, invalid calls fail when the generator is created
+    arguments = dict(zip(parameters, args))
+    arguments.update(kwargs)
+    return {key: value for key, value in arguments.items() if isinstance(value, (str, int, float, dict, list, type(None)))}
+
+def blocking(steps):
+    name = steps.__name__
+    parameters = list(inspect.signature(steps).parameters)[1:]
+    def operation(self, *args, **kwargs):
+        fields = span_fields(parameters, args, kwargs)
+        return self.run(getattr(self, name)(*args, **kwargs), name.lstrip('_'), fields)
+    operation.__name__ = name.lstrip('_')
+    operation.__doc__ = steps.__doc__
+    return operation
+
+def awaitable(steps):
+    name = steps.__name__
+    parameters = list(inspect.signature(steps).parameters)[1:]
+    async def operation(self, *args, **kwargs):
+        fields = span_fields(parameters, args, kwargs)
+        return await self.arun(getattr(self, name)(*args, **kwargs), name.lstrip('_'), fields)
+    operation.__name__ = 'a' + name.lstrip('_')
+    operation.__doc__ = steps.__doc__
+    return operation
+
+
+# transfers whose dry run depends only on their arguments, the valve state, the pump speed and the plunger
+DRY_CACHED = ('move_liquid', 'slow_dispense', 'partial_dispense')
+
+
+class DryRun:
+    '''
+        per-operation breakdown of a dry run, collected from the operation level spans.
+        every operation is a span event with its arguments, duration, wire/busy/padding split
+        and strokes, valve_switches and valve_travel counts
+    '''
+    def __init__(self):
+        self.operations = []
+        self.costs = {} # recorded operations replayed by DaisyChain.run_cached()
+
+    def __call__(self, event):
+        self.operations.append(event)
+        return
+
+    @property
+    def total(self):
+        return sum(op['duration'] for op in self.operations)
+
+    def count(self, name):
+        return sum(op.get(name, 0) for op in self.operations)
+
+    def summary(self):
+        # seconds and number of calls per operation type
+        summary = {}
+        for op in self.operations:
+            seconds, count = summary.get(op['name'], (0.0, 0))
+            summary[op['name']] = (seconds + op['duration'], count + 1)
+        return summary
+
+
 class DaisyChain:
     
     def read_yaml_dict(self, file_path):
@@ -18,14 +94,19 @@ class DaisyChain:
             yaml_dict = yaml.safe_load(file)
         return yaml_dict
 
+    def open_serial_port(self, com_port):
+        return serial.Serial(com_port, 9600, timeout=0.1)
+
     def __init__(self, 
                  port_map_path, 
                  config_path,
-                 verbose = True
+                 verbose = True,
+                 transport = None, # callable com_port -> port object, serial.Serial by default
+                 clock = None # object with sleep() and monotonic(), the time module by default
                  ):
         self.verbose = verbose
-        self.port_map = self.read_yaml_dict(port_map_path)
         self.config = self.read_yaml_dict(config_path)
+        self.read_port_map(port_map_path)
         time_stamp = datetime.now().strftime('%Y-%m-%d-%H-%M')
 
         logging.basicConfig(filename=f'logs/{time_stamp}.log',
@@ -34,12 +115,104 @@ class DaisyChain:
                             level=logging.DEBUG)
         
         self.logger = logging.getLogger(__name__)
-        self.vtree = [serial.Serial(com_port, 9600, timeout=0.1) for com_port in self.config['com_ports']]
+        # transport and clock are pluggable so the chain can run against a simulator (see simulator.py)
+        self.transport = transport if transport is not None else self.open_serial_port
+        self.clock = clock if clock is not None else time
+        self.vtree = [self.transport(com_port) for com_port in self.config['com_ports']]
+        # every packet and reply on the wire, timestamped to traffic_log if configured, see traffic.py
+        self.traffic = None
+        if self.config.get('traffic_log'):
+            self.traffic = TrafficRecorder(self.clock, self.config['traffic_log'])
+            self.vtree = [self.traffic.wrap(v, x) for x, v in enumerate(self.vtree)]
+        self.readers = [FrameReader(v) for v in self.vtree]
+        # per-step timing spans, written as json lines to event_log if configured
+        self.instrumentation = Instrumentation(self.clock)
+        if self.config.get('event_log'):
+            self.instrumentation.add_sink(JsonlSink(self.config['event_log']))
         self.vstate = [0 for v in self.config['valve_types']]
+        self.status = [parse_status(None) for v in self.config['valve_types']] # last interrogated DeviceStatus
         self.vtypes = [vtype for vtype in self.config['valve_types']]
         self.SYRINGE_VOL = self.config['syringe_volume']
         self.DEFAULT_SPEED = self.config['default_speed']
-        self.speed_setting = [self.DEFAULT_SPEED]
+        self.speed_setting = self.DEFAULT_SPEED
+        self.max_speed = self.config.get('max_speed', self.DEFAULT_SPEED) # ml/min, ceiling of nodes without a speed profile
+        # auto-tune raises the speed of a liquid stepwise until the syringe overloads and stores the learned maxima
+        self.auto_tune = self.config.get('auto_tune', False)
+        self.auto_tune_step = self.config.get('auto_tune_step', 1.25) # speed factor per tuning step
+        self.learned_speeds_path = self.config.get('learned_speeds')
+        self.learned_speeds = {}
+        if self.learned_speeds_path and os.path.exists(self.learned_speeds_path):
+            self.learned_speeds = self.read_yaml_dict(self.learned_speeds_path) or {}
+        # 'sleep' waits the experimentally determined durations, 'poll' returns as soon as the device reports ready
+        self.wait_mode = self.config.get('wait_mode', 'sleep')
+        self.poll_interval = self.config.get('poll_interval', 0.05) # s
+        self.timeout_factor = self.config.get('timeout_factor', 3) # timeout = sleep duration * timeout_factor
+        # differential actuation only moves valves whose tracked position differs from the route
+        self.differential_valves = self.config.get('differential_valves', False)
+        # valves moving at the same time may not exceed the power budget, default keeps them one at a time
+        self.valve_power_budget = self.config.get('valve_power_budget', 1)
+        self.valve_current = self.config.get('valve_current', {}) # current weight per valve type, 1 if not listed
+        # run the stroke loops of a route switching only the pump valve as one firmware command string
+        self.compile_strokes = self.config.get('compile_strokes', False)
+        # framed status reads return as soon as the reply frame arrives instead of after the read timeout
+        self.framed_status = self.config.get('framed_status', False)
+        # expected valve motion: switch overhead plus time per position rotated, used for estimates
+        self.valve_switch_time = self.config.get('valve_switch_time', 0.2) # s
+        self.valve_step_time = self.config.get('valve_step_time', 0.1) # s per position
+        self.dry = None # DryRun collecting the estimate while in dry_run()
+        self.dry_status = parse_status(NullPort.ready_frame[2:-3]) # every device reports ready in a dry run
+        self.fluid_moves = None # plunger moves of the operation run_cached() records
+        # fluid path model of the liquid in every line, link and the syringe, dead volumes in ml
+        self.fluid = self.fluid_path()
+        self.plunger = 0 # steps
+        # ensure_primed() and ensure_clean() purge to purge_node, washing with wash_node
+        self.purge_node = self.config.get('purge_node', 'waste')
+        self.wash_node = self.config.get('wash_node', 'water')
+        self.air_node = self.config.get('air_node', 'air') # air gaps of compose() are drawn here
+        self.clean_liquids = self.config.get('clean_liquids', [self.wash_node, 'air'])
+        self.purge_factor = self.config.get('purge_factor', 1.5) # ml purged per ml of foreign liquid in the lines
+        self.purge_volume = self.config.get('purge_volume', 0.1) # ml, smallest purge stroke
+        self.purity = self.config.get('purity', 0.01) # tolerated foreign fraction in the syringe
+        self.max_purges = self.config.get('max_purges', 10)
+        self.purge_seconds_cache = {}
+        # continuous flow warns when the achieved rate is off the target by more than this fraction
+        self.flow_tolerance = self.config.get('flow_tolerance', 0.02)
+        # crash-safe journal of the operations and their pump moves, see resume()
+        self.journal = Journal(self.config['journal']) if self.config.get('journal') else None
+        self.session = False # journal session started
+        self.operation = 0 # index of the current top-level operation in the journal
+        self.step = 0 # pump moves of the current operation
+        self.replay = {} # operations of the interrupted run
+        self.replay_steps = 0 # committed pump moves of the current operation
+
+    def read_port_map(self, port_map_path):
+        '''
+            node -> port address map, nodes can carry a speed profile instead of the bare address:
+                'glycerol': {port: '4', aspirate: 5, dispense: 10} # ceilings in ml/min
+                'toluene': {port: '6', viscosity: low} # class from viscosity_classes in config.yaml
+            and a dead_volume in ml of the line from the valve port to the node, reactors a capacity in ml
+        '''
+        self.port_map = self.read_yaml_dict(port_map_path)
+        self.speed_profiles = {}
+        self.dead_volumes = {}
+        self.capacities = {}
+        viscosity_classes = self.config.get('viscosity_classes', {})
+        for node, entry in self.port_map.items():
+            if not isinstance(entry, dict):
+                continue
+            self.port_map[node] = str(entry['port'])
+            profile = {}
+            if 'viscosity' in entry:
+                if entry['viscosity'] not in viscosity_classes:
+                    raise Exception(f"Node {node}: viscosity class {entry['viscosity']} not in config.yaml viscosity_classes")
+                profile.update(viscosity_classes[entry['viscosity']])
+            profile.update({key: entry[key] for key in ('aspirate', 'dispense') if key in entry})
+            self.speed_profiles[node] = profile
+            if 'dead_volume' in entry:
+                self.dead_volumes[node] = entry['dead_volume']
+            if 'capacity' in entry:
+                self.capacities[node] = entry['capacity']
+        return
 
     def tstamp(self):
         '''
@@ -48,13 +221,15 @@ class DaisyChain:
         return datetime.now().strftime('%H:%M:%S')
 
 
-    def set_pump_speed(self, speed_ml_per_min): # minimum setting is 40 steps/s (hz), factory default 5000 hz
+    def _set_pump_speed(self, speed_ml_per_min): # minimum setting is 40 steps/s (hz), factory default 5000 hz
         # pump speed configuration
         self.speed_setting = speed_ml_per_min
         speed_hz = int(self.speed_setting/self.SYRINGE_VOL * MAX_STEPS/60)
         packet = f'/1V{speed_hz}R\r'
+        span = self.instrumentation.start('speed', device=0, speed=speed_ml_per_min)
         self.vtree[0].write(bytes(packet, 'utf-8'))
-        time.sleep(0.1)
+        yield 0.1
+        self.instrumentation.end(span)
         return
 
 
@@ -70,63 +245,163 @@ class DaisyChain:
         else:
             return False
 
+    def valve_travel(self, curr_pos, next_pos, vtype):
+        '''
+            number of positions the valve rotates going the shorter way, as chosen by is_counter
+        '''
+        if curr_pos == 0: # unknown position
+            return vtype//2
+        return min((next_pos - curr_pos) % vtype, (curr_pos - next_pos) % vtype)
+
 
-    def actuate_valves(self, port_address):
+    def valves_to_move(self, port_address):
+        '''
+            returns (valve index, position) pairs needed to reach the port address.
+            only the valves along the route are considered - the n-th digit of the port address
+            is the position of the n-th valve, downstream valves do not take part in the route.
+            in differential mode valves already in position according to vstate are skipped,
+            0 in vstate marks an unknown position which always gets actuated
+        '''
+        moves = []
         for x, y in enumerate(port_address):
-            ccw = self.is_counter(self.vstate[x], int(y), self.vtypes[x])
-            ccws = '-'
-            packet = f'/1o{ccws*ccw}{y}R\r'## TODO: test this code for c-wise or cc-wise rotation
-            #logger.debug(packet)
-            self.vtree[x].write(bytes(packet, 'utf-8'))
-            self.vstate[x] = int(y)
-            #response = vtree[x].readline()
-            #logger.debug(response)
+            pos = int(y)
+            if not 0 < pos <= self.vtypes[x]:
+                raise Exception(f'Port address {port_address}: valve {x} has no position {pos}')
+            if self.differential_valves and self.vstate[x] == pos:
+                continue
+            moves.append((x, pos))
+        return moves
+
+    def invalidate_valve_state(self, valves=None):
+        '''
+            marks valve positions as unknown so the next actuation moves them regardless of vstate.
+            to be used after errors or manual intervention, invalidates all valves by default
+        '''
+        if valves is None:
+            valves = range(len(self.vstate))
+        for x in valves:
+            self.vstate[x] = 0
+        self.logger.debug(f'valve state invalidated: {self.vstate}')
+        return
+
+    def schedule_valves(self, moves):
+        '''
+            splits valve moves into waves of valves that actuate at the same time.
+            the summed current weight of a wave stays within valve_power_budget,
+            a valve heavier than the whole budget gets a wave of its own
+        '''
+        waves = []
+        wave = []
+        load = 0
+        for x, y in moves:
+            weight = self.valve_current.get(self.vtypes[x], 1)
+            if wave and load + weight > self.valve_power_budget:
+                waves.append(wave)
+                wave = []
+                load = 0
+            wave.append((x, y))
+            load += weight
+        if wave:
+            waves.append(wave)
+        return waves
+
+    def _actuate_valves(self, port_address):
+        if self.step < self.replay_steps:
+            return # the following pump move is committed already, see resume()
+        moves = self.valves_to_move(port_address)
+        if not moves:
+            self.logger.debug(f'valves already at {port_address}')
+            return
+        actuation = self.instrumentation.start('valve actuation', port=port_address)
+        for wave in self.schedule_valves(moves):
+            span = self.instrumentation.start('valve', valves=[x for x, y in wave])
+            if len(wave) == 1:
+                span.fields['device'] = wave[0][0]
+            motion = {}
+            for x, y in wave:
+                travel = self.valve_travel(self.vstate[x], y, self.vtypes[x])
+                motion[x] = self.valve_switch_time + self.valve_step_time*travel
+                self.instrumentation.count('valve_switches')
+                self.instrumentation.count('valve_travel', travel)
+                ccw = self.is_counter(self.vstate[x], y, self.vtypes[x])
+                ccws = '-'
+                packet = f'/1o{ccws*ccw}{y}R\r'## TODO: test this code for c-wise or cc-wise rotation
+                #logger.debug(packet)
+                self.vtree[x].write(bytes(packet, 'utf-8'))
+                self.vstate[x] = y
+                #response = vtree[x].readline()
+                #logger.debug(response)
+            if self.wait_mode == 'poll':
+                # waiting for the wave to finish keeps the power draw within budget
+                for x, y in wave:
+                    yield from self._wait_ready(x, 'valve actuation', 1.5, motion[x])
+                self.instrumentation.end(span)
+                continue
             # delay between actuating valves to decrease simultaneous power draw spike
-            time.sleep(0.5) # problem persists on 3rd valve with 0.5.
-        time.sleep(1)
+            self.instrumentation.busy(max(motion.values()))
+            yield 0.5 # problem persists on 3rd valve with 0.5.
+            self.instrumentation.end(span)
+        if self.wait_mode == 'poll':
+            self.instrumentation.end(actuation)
+            return
+        yield 1
 
         # Check for and log errors, raise warnings
-        for x, y in enumerate(port_address):
-            self.interrogate_state(x, 'valve actuation')
+        for x, y in moves:
+            yield from self._interrogate_state(x, 'valve actuation')
+        self.instrumentation.end(actuation)
         return
     
-    def aspirate_pump(self, abs_steps):
+    def _aspirate_pump(self, abs_steps):
+        if self.skip_step():
+            return
         # pump sleep is experimentaly determined
         speed_hz = int(self.speed_setting/self.SYRINGE_VOL * MAX_STEPS/60)
         pump_sleep_duration =  (abs_steps/speed_hz) + 3
         # print(speed_hz, pump_sleep_duration)
         packet = f'/1A{abs_steps}R\r'
         # logger.debug(packet)
+        span = self.instrumentation.start('aspirate', device=0, target=abs_steps)
+        self.instrumentation.count('strokes')
         self.vtree[0].write(bytes(packet, 'utf-8'))
         # response = vtree[0].readline()
         # logger.debug(response)
-        time.sleep(pump_sleep_duration)
-        self.interrogate_state(0, 'aspirate pump')
+        yield from self._wait_ready(0, 'aspirate pump', pump_sleep_duration, abs_steps/speed_hz)
+        self.track_plunger(abs_steps)
+        self.instrumentation.end(span)
         return
     
-    def dispense_pump(self, abs_steps):
+    def _dispense_pump(self, abs_steps):
+        if self.skip_step():
+            return
         #always  dispenses to zero, but needs the number of steps to calculate sleep duration    
         speed_hz = int(self.speed_setting/self.SYRINGE_VOL * MAX_STEPS/60)
         pump_sleep_duration =  (abs_steps/speed_hz) + 3
         #print(speed_hz, pump_sleep_duration)
         packet = f'/1A0R\r'
         #logger.debug(packet)
+        span = self.instrumentation.start('dispense', device=0, target=0)
         self.vtree[0].write(bytes(packet, 'utf-8'))
         #response = vtree[0].readline()
         #logger.debug(response)
-        time.sleep(pump_sleep_duration)
-        self.interrogate_state(0, 'dispense pump')
+        yield from self._wait_ready(0, 'dispense pump', pump_sleep_duration, abs_steps/speed_hz)
+        self.track_plunger(0)
+        self.instrumentation.end(span)
         return
     
-    def initialize_daisy_chain(self, home_pos=False):
+    def _initialize_daisy_chain(self, home_pos=False):
 
         if home_pos == False:
-            for v in self.vtree:
+            for x, v in enumerate(self.vtree):
                 v.write(bytes('/1o1R\r', 'utf-8'))
+                self.vstate[x] = 1
         else:
-            self.actuate_valves(home_pos)
+            yield from self._actuate_valves(home_pos)
 
-            
+        yield from self._home_pump()
+        return
+
+    def _home_pump(self):
         #packet = '/1W4R\r'
         #self.logger.debug(packet)
         
@@ -135,20 +410,93 @@ class DaisyChain:
         #response = self.vtree[0].readlines()
         #self.logger.debug(response)
         self.vtree[0].write(b'/1W4R\r')
-        response = self.vtree[0].readlines()
+        response = yield self.vtree[0]
         self.logger.debug(f'INITIALIZE COMMAND RESPONSE: {response}')
         if self.verbose: print('initialization response: ', response)
-        time.sleep(5)
+        yield 5
         self.vtree[0].write(b'/1Q\r')
-        response = self.vtree[0].readlines()
+        response = yield self.vtree[0]
         self.logger.debug(response)
-        self.set_pump_speed(self.DEFAULT_SPEED)
-        self.dispense_pump(0)
-        time.sleep(5) # presumably enough time to dispense, TODO: add busy status checks in state interogation
+        self.plunger = 0 # homed
+        yield from self._set_pump_speed(self.DEFAULT_SPEED)
+        yield from self._dispense_pump(0)
+        if self.wait_mode != 'poll':
+            yield 5 # presumably enough time to dispense, poll mode already waited for ready status
+        return
+
+    def _read_replies(self, vtree_index, count):
+        # reply frames to the last count commands sent to the device, fewer if it stops answering
+        if not self.framed_status:
+            response = yield self.vtree[vtree_index]
+            return [match for line in response for match in FRAME_PATTERN.findall(line)]
+        codes = []
+        while len(codes) < count:
+            frames = yield self.readers[vtree_index]
+            if not frames:
+                break
+            codes += frames
+        return codes
+
+    def _warm_start(self):
+        '''
+            reconnects to a chain that may be initialized already, e.g. after a kernel restart: all devices
+            are asked for their status and positions at once, vstate and the plunger position are read back
+            and only devices reporting syringe or device not initialized are homed like initialize_daisy_chain
+        '''
+        if self.dry is not None:
+            # dry run: the chain is taken as initialized in its tracked state
+            yield from self._set_pump_speed(self.DEFAULT_SPEED)
+            return
+        for x, v in enumerate(self.vtree):
+            v.reset_input_buffer()
+            self.readers[x] = FrameReader(v)
+            v.write(b'/1Q\r')
+            v.write(b'/1?6\r') # valve position
+            if x == 0:
+                v.write(b'/1?\r') # plunger position
+        replies = []
+        for x, v in enumerate(self.vtree):
+            codes = yield from self._read_replies(x, 3 if x == 0 else 2)
+            replies.append(codes)
+        if not self.framed_status:
+            yield 0.1
+
+        homing = []
+        for x, codes in enumerate(replies):
+            if len(codes) < (3 if x == 0 else 2):
+                raise Exception(f'WARM START: v{x} did not answer, {codes}')
+            status = parse_status(codes[0])
+            self.status[x] = status
+            if status.code in NOT_INITIALIZED_CODE:
+                homing.append(x)
+                continue
+            if status.level in ('critical', 'unknown') or status.busy:
+                raise Exception(f'WARM START: v{x} {status.description}, run initialize_daisy_chain()')
+            self.vstate[x] = int(codes[1][1:])
+            if x == 0:
+                self.plunger = int(codes[2][1:])
+        self.logger.info(f'warm start: vstate {self.vstate}, plunger {self.plunger}, homing {homing}')
+        if self.verbose: print(f'{self.tstamp()} warm start: valves {self.vstate}, plunger {self.plunger}, homing {homing}')
+
+        for x in homing:
+            self.vtree[x].write(b'/1o1R\r')
+            self.vstate[x] = 1
+        # the positions were lost, so the waits allow for a full turn
+        for x in homing:
+            if x > 0:
+                yield from self._wait_ready(x, 'valve homing', 1.5, self.valve_switch_time + self.valve_step_time*self.vtypes[x])
+        if 0 in homing:
+            yield self.valve_switch_time + self.valve_step_time*self.vtypes[0] # a pump not initialized reports critical, no polling
+            yield from self._home_pump()
+        else:
+            if self.plunger > 0:
+                # liquid of unknown origin is left in the syringe
+                self.fluid.syringe[None] = self.fluid.syringe.get(None, 0.0) + self.plunger*self.SYRINGE_VOL/MAX_STEPS
+            yield from self._set_pump_speed(self.DEFAULT_SPEED) # the device may still run at another speed
         return
     
     # MAIN FUNCTION
-    def move_liquid(self, source, sink, volume, times=1):
+    def _move_liquid(self, source, sink, volume, times=1):
         ''' 
             liquid is moved by actuating valves to source node, aspirating a specific volume,
             actuating the valves to destination node and dispensing the volume
@@ -165,15 +513,14 @@ class DaisyChain:
         
         # CALCULATE NUMBER OF PUMP MOVES AND CONVERT VOLUME TO TOTAL MOTOR STEPS
         total_steps = int(MAX_STEPS*volume/self.SYRINGE_VOL)
+        repeats, vol_steps = self.stroke_split(volume)
         
-        # if volume is greater than the syring size, it is split up in equal parts and moved or several repeat moves
-        repeats = math.ceil(total_steps/MAX_STEPS)
-        
-        if repeats > 1:
-            vol_steps = int(total_steps/repeats)
-        else:
-            vol_steps = total_steps
-        
+        if self.compile_strokes and self.compilable(from_port, to_port) and vol_steps > 0:
+            yield from self._compiled_strokes(from_port, to_port, times*repeats, vol_steps,
+                                              aspirate_speed=self.liquid_speed(source, 'aspirate'),
+                                              dispense_speed=self.liquid_speed(source, 'dispense'))
+            return
+
         # times variable is useful for purging and priming with small volumes
         for _ in range(times):
 
@@ -185,22 +532,23 @@ class DaisyChain:
                     print(f'{self.tstamp()}        divided move {repeat+1}/{repeats}: {round(vol_steps*self.SYRINGE_VOL/MAX_STEPS, 1)}ml ({round((repeat+1)*vol_steps*self.SYRINGE_VOL/MAX_STEPS, 1)}/{round(self.SYRINGE_VOL*total_steps/MAX_STEPS, 1)}ml)')
                 
                 # ACTUATE VALVES TO INPUT
-                self.actuate_valves(from_port)
+                yield from self._actuate_valves(from_port)
                 
                 # ASPIRATE
-                self.aspirate_pump(vol_steps)
+                yield from self._profiled_move(source, 'aspirate', vol_steps, self._aspirate_pump)
                 
                 # ACTUATE VALVES TO OUTPUT
-                self.actuate_valves(to_port)
+                yield from self._actuate_valves(to_port)
                 
                 # DISPENSE
-                self.dispense_pump(vol_steps)
+                yield from self._profiled_move(source, 'dispense', vol_steps, self._dispense_pump)
                 
+        yield from self._restore_speed()
         return
 
 
 
-    def slow_dispense(self, source, sink, volume, dispense_speed, times=1):
+    def _slow_dispense(self, source, sink, volume, dispense_speed, times=1):
         ''' 
             slow dispence is a modified move_liquid function for when slow additions or semi-continuos flow puming is required
 
@@ -223,6 +571,12 @@ class DaisyChain:
         else:
             vol_steps = total_steps
         
+        if self.compile_strokes and self.compilable(from_port, to_port) and vol_steps > 0:
+            yield from self._compiled_strokes(from_port, to_port, times*repeats, vol_steps,
+                                              aspirate_speed=self.liquid_speed(source, 'aspirate'),
+                                              dispense_speed=dispense_speed)
+            return
+
         # times variable is useful for purging and priming with small volumes
         for _ in range(times):
 
@@ -233,40 +587,195 @@ class DaisyChain:
                 if self.verbose == True and repeats > 1:
                     print(f'{self.tstamp()}        divided move {repeat+1}/{repeats}: {round(vol_steps*self.SYRINGE_VOL/MAX_STEPS, 1)}ml ({round((repeat+1)*vol_steps*self.SYRINGE_VOL/MAX_STEPS, 1)}/{round(self.SYRINGE_VOL*total_steps/MAX_STEPS, 1)}ml)')
                 # ACTUATE VALVES TO INPUT
-                self.actuate_valves(from_port)
+                yield from self._actuate_valves(from_port)
                 
                 # ASPIRATE
                 
-                self.aspirate_pump(vol_steps)
+                yield from self._profiled_move(source, 'aspirate', vol_steps, self._aspirate_pump)
                 
                 # ACTUATE VALVES TO OUTPUT
-                self.actuate_valves(to_port)
+                yield from self._actuate_valves(to_port)
                 
                 # DISPENSE
-                self.set_pump_speed(dispense_speed)
-                self.dispense_pump(vol_steps)
-                self.set_pump_speed(self.DEFAULT_SPEED)
+                yield from self._set_pump_speed(dispense_speed)
+                yield from self._dispense_pump(vol_steps)
+                yield from self._set_pump_speed(self.DEFAULT_SPEED)
         return
 
-    def interrogate_state(self, vtree_index, substep_name):
-        # Define the regex pattern
-        pattern_bytes = rb'/0(.*?)\x03\r\n'
+    def compose_strokes(self, recipe, air_gap=0.0):
+        '''
+            packs the (source, volume) reagents of a recipe into syringe strokes, in order and with air_gap ml
+            of air between neighbouring reagents of a stroke. a reagent starts a new stroke if it does not fit,
+            only reagents larger than the room left in an empty syringe are split.
+            returns the strokes as lists of (node, steps)
+        '''
+        gap = int(MAX_STEPS*air_gap/self.SYRINGE_VOL)
+        strokes = [[]]
+        position = 0
+        for source, volume in recipe:
+            steps = int(MAX_STEPS*volume/self.SYRINGE_VOL)
+            while steps > 0:
+                if strokes[-1] and position + gap + steps > MAX_STEPS:
+                    strokes.append([])
+                    position = 0
+                if strokes[-1] and gap:
+                    strokes[-1].append((self.air_node, gap))
+                    position += gap
+                chunk = min(steps, MAX_STEPS - position)
+                strokes[-1].append((source, chunk))
+                position += chunk
+                steps -= chunk
+        return [stroke for stroke in strokes if stroke]
+
+    def _compose(self, sink, recipe, air_gap=0.0):
+        '''
+            delivers several reagents to sink in one dispense: the (source, volume) pairs of the recipe are
+            stacked in the syringe by relative plunger moves, separated by air_gap ml from air_node, and split
+            across strokes only where the syringe volume is exceeded. the dispense runs at the slowest
+            dispense speed of the reagents in the stroke
+        '''
+        recipe = [(source, volume) for source, volume in recipe]
+        self.logger.info(f'compose: {recipe} into {sink}, {air_gap} ml air gaps')
+        if self.verbose: print(f'{self.tstamp()} compose: {recipe} into {sink}, {air_gap} ml air gaps')
+        if air_gap and self.air_node not in self.port_map:
+            raise Exception(f'Air node {self.air_node} not added to port_map.yaml configuration file!')
+        to_port = self.port_map[sink]
+        strokes = self.compose_strokes(recipe, air_gap)
+
+        for n, stroke in enumerate(strokes):
+            if self.verbose == True and len(strokes) > 1:
+                print(f'{self.tstamp()}    stroke {n + 1} of {len(strokes)}: {[node for node, steps in stroke if node != self.air_node]}')
+            # ASPIRATE the reagents one after the other
+            position = 0
+            for node, steps in stroke:
+                yield from self._actuate_valves(self.port_map[node])
+                yield from self._profiled_move(node, 'aspirate', position + steps,
+                                               lambda target, offset=position: self._relative_aspirate_pump(target, offset))
+                position += steps
+
+            # ACTUATE VALVES TO OUTPUT
+            yield from self._actuate_valves(to_port)
+
+            # DISPENSE everything at once
+            speed = min(self.liquid_speed(node, 'dispense') for node, steps in stroke)
+            if speed != self.speed_setting:
+                yield from self._set_pump_speed(speed)
+            yield from self._dispense_pump(position)
+        yield from self._restore_speed()
+        return
+
+    def _continuous_flow(self, source, sink, rate, duration=None, volume=None):
+        '''
+            semi-continuous flow from source to sink at rate ml/min, for duration s or volume ml.
+            full syringe strokes refill at the fastest known-safe speed of the liquid (liquid_speed(), the default
+            speed unless auto-tune or a speed profile allows more) and the valves only switch where the route
+            changes. the dispense speed of every stroke is corrected for the refill gaps so
+            far, so the time-averaged rate from the first dispense to the last meets the target.
+            returns the achieved versus target rate and the duty cycle, the share of that time spent dispensing
+        '''
+        if volume is None:
+            if duration is None:
+                raise Exception('continuous flow needs a duration or a volume')
+            volume = rate*duration/60
+        self.logger.info(f'continuous flow: {volume} ml liquid from {source} to {sink} at {rate} ml/min')
+        if self.verbose: print(f'{self.tstamp()} continuous flow: {volume} ml liquid from {source} to {sink} at {rate} ml/min')
+
+        from_port = self.port_map[source]
+        to_port = self.port_map[sink]
+        strokes, vol_steps = self.stroke_split(volume)
+        if vol_steps == 0:
+            raise Exception(f'continuous flow: {volume} ml is below the syringe resolution')
+        stroke = vol_steps*self.SYRINGE_VOL/MAX_STEPS
+        ceiling = self.speed_ceiling(source, 'dispense')
+        slowest = 40*60*self.SYRINGE_VOL/MAX_STEPS # ml/min at the minimum pump setting of 40 hz
+        speeds = []
+        dispensing = 0.0
+        lag = 0.0 # s a dispense took longer than the plunger travel at its speed, status polling and padding
+        for n in range(strokes):
+            if self.verbose == True and strokes > 1:
+                print(f'{self.tstamp()}    stroke {n + 1} of {strokes}')
+            # REFILL
+            refill_start = self.clock.monotonic()
+            yield from self._actuate_valves(from_port)
+            yield from self._profiled_move(source, 'aspirate', vol_steps, self._aspirate_pump)
+            yield from self._actuate_valves(to_port)
+            now = self.clock.monotonic()
+            refill = now - refill_start
+            if n == 0:
+                flow_start = now
+                flow_end = flow_start + strokes*stroke/rate*60
+
+            # DISPENSE, the time left after the refills still to come is shared by the remaining strokes
+            available = (flow_end - now - (strokes - n - 1)*refill)/(strokes - n) - lag
+            speed = min(max(stroke/available*60, slowest), ceiling) if available > 0 else ceiling
+            if self.speed_to_hz(speed) != self.speed_to_hz(self.speed_setting):
+                yield from self._set_pump_speed(speed)
+            speeds.append(speed)
+            start = self.clock.monotonic()
+            yield from self._dispense_pump(vol_steps)
+            dispensing += self.clock.monotonic() - start
+            lag = self.clock.monotonic() - start - vol_steps/self.speed_to_hz(self.speed_setting)
+
+            # the slowest pump speed is still too fast: hold the next refill until the schedule catches up
+            ahead = flow_start + (n + 1)*stroke/rate*60 - self.clock.monotonic()
+            if n < strokes - 1 and ahead > 0 and speed == slowest:
+                yield ahead
+        flow_time = self.clock.monotonic() - flow_start
+        yield from self._restore_speed()
+
+        report = {'target_rate': rate,
+                  'achieved_rate': round(strokes*stroke/flow_time*60, 4),
+                  'duty_cycle': round(dispensing/flow_time, 3),
+                  'volume': round(strokes*stroke, 4),
+                  'flow_time': round(flow_time, 1),
+                  'strokes': strokes,
+                  'dispense_speeds': [round(speed, 2) for speed in speeds]}
+        self.logger.info(f'continuous flow: {report}')
+        if self.verbose: print(f"{self.tstamp()} continuous flow: {report['achieved_rate']} of {rate} ml/min, duty cycle {report['duty_cycle']}")
+        if abs(report['achieved_rate'] - rate) > self.flow_tolerance*rate:
+            warning_string = f"{source} to {sink}: achieved {report['achieved_rate']} ml/min, target {rate} ml/min"
+            self.logger.warning(warning_string)
+            warnings.warn(warning_string)
+        return report
+
+    def _interrogate_state(self, vtree_index, substep_name):
+        if self.dry is not None:
+            # dry run: the device answers ready after the round trip of the real port, the virtual clock
+            # is advanced directly instead of through the generator driver and no sub-step span is opened
+            port = self.vtree[vtree_index]
+            latency = port.latency if self.framed_status else port.timeout
+            self.instrumentation.wire(latency)
+            self.clock.sleep(latency if self.framed_status else latency + 0.1)
+            self.status[vtree_index] = self.dry_status
+            return self.dry_status.code
+        span = self.instrumentation.start('interrogation', device=vtree_index)
         response_codes = set([])
-        self.vtree[vtree_index].write(b'/1Q\r')
-        response = self.vtree[vtree_index].readlines()
-        for line in response:
+        last_code = None
+        if self.framed_status:
+            # replies to earlier commands are collected first, then exactly one frame is awaited
+            reader = self.readers[vtree_index]
+            reader.drain()
+            self.vtree[vtree_index].write(b'/1Q\r')
+            codes = yield reader
+        else:
+            self.vtree[vtree_index].write(b'/1Q\r')
+            response = yield self.vtree[vtree_index]
             # Find all matches in the input bytes string
-            matches = re.findall(pattern_bytes, line)
-            # Print the extracted characters
-            for match in matches:
-                response_codes.add(match)
+            codes = [match for line in response for match in FRAME_PATTERN.findall(line)]
+        for code in codes:
+            response_codes.add(code)
+            last_code = code
         #print(response_set)
         if response_codes:
             for code in response_codes.intersection(CRITICAL_CODE.keys()): # if any warning codes matched with warning code dictionary this gets executed
                 warning_string = f'v{vtree_index} {substep_name}: {CRITICAL_CODE[code]}'
                 self.logger.critical(warning_string)
                 warnings.warn(warning_string)
+                self.invalidate_valve_state()
                 raise Exception(f'STALL: {warning_string}')
+
+            if response_codes.intersection(VALVE_ERROR_CODE):
+                self.invalidate_valve_state([vtree_index])
                 
             for code in response_codes.intersection(WARNING_CODE.keys()): # if any warning codes matched with warning code dictionary this gets executed
                 warning_string = f'v{vtree_index} {substep_name}: {WARNING_CODE[code]}'
@@ -287,26 +796,73 @@ class DaisyChain:
             warning_string = f'v{vtree_index} {substep_name}: No response'
             self.logger.warning(warning_string)
             warnings.warn(warning_string)
-        time.sleep(0.1)
-        return
+        if not self.framed_status:
+            yield 0.1
+        self.status[vtree_index] = parse_status(last_code)
+        self.instrumentation.end(span)
+        # the most recent status code, replies to earlier commands may still be in the buffer
+        return last_code
+
+    def _wait_ready(self, vtree_index, substep_name, sleep_duration, device_time=0):
+        '''
+            waits for the device to finish its last command and checks its state.
+            in 'sleep' mode the experimentally determined sleep duration is waited out,
+            in 'poll' mode the device is interrogated every poll_interval until it reports ready,
+            a TIMEOUT exception is raised if it is still busy after sleep_duration*timeout_factor.
+            device_time is the expected motion time, recorded as busy time in sleep mode
+        '''
+        if self.dry is not None:
+            # dry run: the device is predicted ready after its expected motion time in poll mode
+            if self.wait_mode == 'poll':
+                self.instrumentation.busy(device_time)
+                self.clock.sleep(device_time + self.poll_interval)
+            else:
+                self.instrumentation.busy(min(device_time, sleep_duration))
+                self.clock.sleep(sleep_duration)
+            yield from self._interrogate_state(vtree_index, substep_name)
+            return
+        if self.wait_mode != 'poll':
+            self.instrumentation.busy(min(device_time, sleep_duration))
+            yield sleep_duration
+            yield from self._interrogate_state(vtree_index, substep_name)
+            return
+        timeout = sleep_duration*self.timeout_factor
+        start = self.clock.monotonic()
+        wire_start = self.instrumentation.wire_total
+        while True:
+            yield self.poll_interval
+            code = yield from self._interrogate_state(vtree_index, substep_name)
+            if code is not None and code not in BUSY_CODE:
+                # busy until ready was reported, minus the time spent on the wire
+                self.instrumentation.busy(self.clock.monotonic() - start - (self.instrumentation.wire_total - wire_start))
+                return
+            if self.clock.monotonic() - start > timeout:
+                warning_string = f'v{vtree_index} {substep_name}: still busy after {round(timeout, 1)}s'
+                self.logger.critical(warning_string)
+                self.invalidate_valve_state([vtree_index])
+                raise Exception(f'TIMEOUT: {warning_string}')
 
-    def relative_dispense_pump(self, abs_steps, offset_steps):
+    def _relative_dispense_pump(self, abs_steps, offset_steps):
         '''
             needs the number of both absolute steps and offset steps to calculate the difference for the sleep duration    
         '''
+        if self.skip_step():
+            return
         speed_hz = int(self.speed_setting/self.SYRINGE_VOL * MAX_STEPS/60)
         pump_sleep_duration =  ((abs_steps-offset_steps)/speed_hz) + 3
         #print(speed_hz, pump_sleep_duration)
         packet = f'/1A{offset_steps}R\r'
         #logger.debug(packet)
+        span = self.instrumentation.start('dispense', device=0, target=offset_steps)
         self.vtree[0].write(bytes(packet, 'utf-8'))
         #response = vtree[0].readline()
         #logger.debug(response)
-        time.sleep(pump_sleep_duration)
-        self.interrogate_state(0, 'relative dispense pump')
+        yield from self._wait_ready(0, 'relative dispense pump', pump_sleep_duration, (abs_steps-offset_steps)/speed_hz)
+        self.track_plunger(offset_steps)
+        self.instrumentation.end(span)
         return
 
-    def fill_syringe(self, node, offset, speed):
+    def _fill_syringe(self, node, offset, speed):
         '''
             offset fill handling
         '''
@@ -314,13 +870,13 @@ class DaisyChain:
         if self.verbose: print(f'{self.tstamp()} fill syringe: {offset} ml liquid from {node} at {speed} ml/min')
         offset_steps = int(MAX_STEPS*offset/self.SYRINGE_VOL)
         port_pos = self.port_map[node]
-        self.actuate_valves(port_pos)
-        self.set_pump_speed(speed)
-        self.aspirate_pump(offset_steps)
-        self.set_pump_speed(self.DEFAULT_SPEED)
+        yield from self._actuate_valves(port_pos)
+        yield from self._set_pump_speed(speed)
+        yield from self._aspirate_pump(offset_steps)
+        yield from self._set_pump_speed(self.DEFAULT_SPEED)
         return
 
-    def empty_syringe(self, node, offset, speed):
+    def _empty_syringe(self, node, offset, speed):
         '''
             offset fill handling
         '''
@@ -328,29 +884,34 @@ class DaisyChain:
         if self.verbose: print(f'{self.tstamp()} empty syringe: {offset} ml liquid to {node} at {speed} ml/min')
         offset_steps = int(MAX_STEPS*offset/self.SYRINGE_VOL)
         port_pos = self.port_map[node]
-        self.actuate_valves(port_pos)
-        self.set_pump_speed(speed)
-        self.dispense_pump(offset_steps)
-        self.set_pump_speed(self.DEFAULT_SPEED)
+        yield from self._actuate_valves(port_pos)
+        yield from self._set_pump_speed(speed)
+        yield from self._dispense_pump(offset_steps)
+        yield from self._set_pump_speed(self.DEFAULT_SPEED)
         return
 
-    def relative_aspirate_pump(self, abs_steps, offset_steps):
+    def _relative_aspirate_pump(self, abs_steps, offset_steps):
         '''
             custom step with offset fill handling
         '''
+        if self.skip_step():
+            return
         speed_hz = int(self.speed_setting/self.SYRINGE_VOL * MAX_STEPS/60)
         pump_sleep_duration =  ((abs_steps-offset_steps)/speed_hz) + 3
         #print(speed_hz, pump_sleep_duration)
         packet = f'/1A{abs_steps}R\r'
         #logger.debug(packet)
+        span = self.instrumentation.start('aspirate', device=0, target=abs_steps)
+        self.instrumentation.count('strokes')
         self.vtree[0].write(bytes(packet, 'utf-8'))
         #response = vtree[0].readline()
         #logger.debug(response)
-        time.sleep(pump_sleep_duration)
-        self.interrogate_state(0, 'relative aspirate pump')
+        yield from self._wait_ready(0, 'relative aspirate pump', pump_sleep_duration, (abs_steps-offset_steps)/speed_hz)
+        self.track_plunger(abs_steps)
+        self.instrumentation.end(span)
         return
 
-    def partial_dispense(self, source, sink, volume, offset, aspirate_speed, dispense_speed, times=1):
+    def _partial_dispense(self, source, sink, volume, offset, aspirate_speed, dispense_speed, times=1):
         ''' 
             liquid is moved by actuating valves to source node, aspirating a specific volume,
             actuating the valves to destination node and dispensing the volume
@@ -378,6 +939,11 @@ class DaisyChain:
         else:
             vol_steps = total_steps
 
+        if self.compile_strokes and self.compilable(from_port, to_port) and vol_steps > 0:
+            yield from self._compiled_strokes(from_port, to_port, times*repeats, vol_steps + offset_steps, offset_steps,
+                                              aspirate_speed, dispense_speed)
+            return
+
         # times variable is useful for purging and priming with small volumes
         for _ in range(times):
 
@@ -389,24 +955,672 @@ class DaisyChain:
                 if self.verbose == True and repeats > 1:
                     print(f'{self.tstamp()}        divided move {repeat+1}/{repeats}: {round(vol_steps*self.SYRINGE_VOL/MAX_STEPS, 1)}ml ({round((repeat+1)*vol_steps*self.SYRINGE_VOL/MAX_STEPS, 1)}/{round(self.SYRINGE_VOL*total_steps/MAX_STEPS, 1)}ml)')
                 # ACTUATE VALVES TO INPUT
-                self.actuate_valves(from_port)
+                yield from self._actuate_valves(from_port)
                 
                 # ASPIRATE
-                self.set_pump_speed(aspirate_speed)
-                self.relative_aspirate_pump(vol_steps + offset_steps, offset_steps)
+                yield from self._set_pump_speed(aspirate_speed)
+                yield from self._relative_aspirate_pump(vol_steps + offset_steps, offset_steps)
                 
                 # ACTUATE VALVES TO OUTPUT
-                self.actuate_valves(to_port)
+                yield from self._actuate_valves(to_port)
                 
                 # DISPENSE
-                self.set_pump_speed(dispense_speed)
+                yield from self._set_pump_speed(dispense_speed)
                 #dispense to offset
-                self.relative_dispense_pump(vol_steps + offset_steps, offset_steps)
+                yield from self._relative_dispense_pump(vol_steps + offset_steps, offset_steps)
         
-        self.set_pump_speed(self.DEFAULT_SPEED)
+        yield from self._set_pump_speed(self.DEFAULT_SPEED)
+        return
+
+
+
+    def speed_to_hz(self, speed_ml_per_min):
+        return int(speed_ml_per_min/self.SYRINGE_VOL * MAX_STEPS/60)
+
+    def stroke_split(self, volume):
+        '''
+            (strokes, steps per stroke) of a transfer, volumes greater than the syringe size are split up in equal parts
+        '''
+        total_steps = int(MAX_STEPS*volume/self.SYRINGE_VOL)
+        repeats = math.ceil(total_steps/MAX_STEPS)
+        if repeats > 1:
+            return repeats, int(total_steps/repeats)
+        return repeats, total_steps
+
+    # FLUID PATH
+    def fluid_path(self):
+        return FluidPath(self.port_map, self.dead_volumes,
+                         line_volume=self.config.get('line_volume', 0.2),
+                         link_volume=self.config.get('link_volume', 0.1),
+                         syringe_residual=self.config.get('syringe_residual', 0.0))
+
+    def route(self):
+        '''
+            port address the syringe is connected to according to vstate, position 1 leads on to the next valve
+        '''
+        address = ''
+        for pos in self.vstate:
+            address += str(pos)
+            if pos != 1:
+                break
+        return address
+
+    def track_plunger(self, target):
+        # the fluid path model follows the plunger along the current route, overloaded moves did not happen
+        if self.status[0].code in OVERLOAD_CODE:
+            return
+        volume = (target - self.plunger)*self.SYRINGE_VOL/MAX_STEPS
+        route = self.route()
+        self.follow_fluid(route, volume)
+        self.plunger = target
+        self.journal_step(route, volume)
+        return
+
+    def follow_fluid(self, route, volume):
+        if self.fluid_moves is not None:
+            self.fluid_moves.append((route, volume)) # recorded for run_cached()
+        if volume > 0:
+            self.fluid.aspirate(route, volume)
+        elif volume < 0:
+            self.fluid.dispense(route, -volume)
+        return
+
+    def purged(self, model, segments, liquids):
+        return model.impurity(segments, liquids) <= self.purity and model.contamination(liquids) <= self.purity
+
+    def purge_times(self, source, sink, segments, liquids, volume):
+        # move_liquid(source, sink, volume) purges until the model copy is within purity, None if max_purges is not enough
+        model = self.fluid.copy()
+        repeats, vol_steps = self.stroke_split(volume)
+        stroke = vol_steps*self.SYRINGE_VOL/MAX_STEPS
+        times = 0
+        while not self.purged(model, segments, liquids):
+            if times == self.max_purges:
+                return None
+            for repeat in range(repeats):
+                model.aspirate(self.port_map[source], stroke)
+                model.dispense(self.port_map[sink], stroke)
+            times += 1
+        return times
+
+    def purge_plan(self, source, sink, segments, liquids):
+        '''
+            (volume, times) of the move_liquid(source, sink) purge after which the foreign fraction of the
+            segments and the syringe is within purity, predicted on a copy of the fluid path model.
+            a segment on both routes (the pump valve link) takes the syringe blend after every stroke and
+            is only diluted, so stroke volumes from purge_factor times the foreign volume up to the syringe
+            are tried and the purge with the shortest dry run wins. times is 0 if nothing needs purging
+        '''
+        volume = max(self.purge_factor*self.fluid.foreign(segments, liquids), self.purge_volume)
+        if self.purged(self.fluid, segments, liquids):
+            return volume, 0
+        candidates = [] # (volume, times)
+        while True:
+            times = self.purge_times(source, sink, segments, liquids, volume)
+            if times is not None:
+                candidates.append((volume, times))
+            # larger strokes cannot purge in fewer than one
+            if times == 1 or volume >= self.SYRINGE_VOL:
+                break
+            volume = min(2*volume, self.SYRINGE_VOL)
+        if not candidates:
+            warning_string = f'{source} to {sink}: {segments} not clean after {self.max_purges} purges'
+            self.logger.warning(warning_string)
+            warnings.warn(warning_string)
+            return volume, self.max_purges
+        if len(candidates) == 1:
+            return candidates[0]
+        return min(candidates, key=lambda candidate: self.purge_seconds(source, sink, *candidate))
+
+    def purge_seconds(self, source, sink, volume, times):
+        # dry run duration of the purge, the same purges recur in a campaign
+        key = (source, sink, volume, times, tuple(self.vstate), self.speed_setting,
+               self.liquid_speed(source, 'aspirate'), self.liquid_speed(sink, 'dispense'))
+        if key not in self.purge_seconds_cache:
+            with self.dry_run():
+                start = self.clock.monotonic()
+                self.run(self._move_liquid(source, sink, volume, times))
+                self.purge_seconds_cache[key] = self.clock.monotonic() - start
+        return self.purge_seconds_cache[key]
+
+    def _ensure_primed(self, node, sink=None):
+        '''
+            fills the path from node to the syringe with its liquid: purges to sink (purge_node by default)
+            only as much as the fluid path model holds foreign liquid, nothing if node is already primed
+        '''
+        sink = sink or self.purge_node
+        volume, times = self.purge_plan(node, sink, self.fluid.path(self.port_map[node]), [node])
+        if not times:
+            self.logger.info(f'{node} already primed')
+            if self.verbose: print(f'{self.tstamp()} {node} already primed')
+            return
+        yield from self._move_liquid(node, sink, volume, times)
+        return
+
+    def _ensure_clean(self, sink=None, wash=None):
+        '''
+            washes the syringe and the links between the valves on the way from wash (wash_node by default)
+            to sink (purge_node by default) until they hold only clean_liquids, and the line of sink unless
+            it is the purge node. nothing is moved if the fluid path model finds them clean already
+        '''
+        sink = sink or self.purge_node
+        wash = wash or self.wash_node
+        segments = set(self.fluid.path(self.port_map[wash]) + self.fluid.path(self.port_map[sink]))
+        segments.discard(self.purge_node)
+        liquids = set(self.clean_liquids) | {wash}
+        volume, times = self.purge_plan(wash, sink, sorted(segments), liquids)
+        if not times:
+            self.logger.info(f'path to {sink} already clean')
+            if self.verbose: print(f'{self.tstamp()} path to {sink} already clean')
+            return
+        yield from self._move_liquid(wash, sink, volume, times)
+        return
+
+    # SPEED PROFILES
+    def speed_ceiling(self, node, direction):
+        return self.speed_profiles.get(node, {}).get(direction, self.max_speed)
+
+    def liquid_speed(self, node, direction):
+        '''
+            speed in ml/min to 'aspirate' or 'dispense' the liquid of node: the learned maximum
+            if auto-tune found one, else the ceiling of its speed profile, else the default speed
+        '''
+        ceiling = self.speed_ceiling(node, direction)
+        learned = self.learned_speeds.get(node, {}).get(direction)
+        if learned is not None:
+            return min(learned, ceiling)
+        if direction in self.speed_profiles.get(node, {}):
+            return ceiling
+        return min(self.DEFAULT_SPEED, ceiling)
+
+    def tune_speed(self, node, direction, speed):
+        # one step up towards the ceiling, unless that speed already overloaded the syringe
+        trial = min(speed*self.auto_tune_step, self.speed_ceiling(node, direction))
+        overload = self.learned_speeds.get(node, {}).get(f'{direction}_overload')
+        if overload is not None and trial >= overload:
+            return speed
+        return trial
+
+    def learn_speed(self, node, direction, speed, overload=None):
+        learned = self.learned_speeds.setdefault(node, {})
+        learned[direction] = round(speed, 2)
+        if overload is not None:
+            learned[f'{direction}_overload'] = round(overload, 2)
+        self.logger.info(f'{node} {direction} speed learned: {round(speed, 2)} ml/min')
+        if self.learned_speeds_path:
+            with open(self.learned_speeds_path, 'w') as file:
+                yaml.safe_dump(self.learned_speeds, file)
         return
 
+    def _profiled_move(self, node, direction, steps, move):
+        '''
+            runs the absolute plunger move move(steps) at the speed profile of the liquid of node.
+            with auto_tune the speed is raised one step per stroke until the pump reports a syringe
+            overload, then the stroke is repeated at the last good speed, which is stored as the maximum
+        '''
+        speed = self.liquid_speed(node, direction)
+        tuning = self.auto_tune and self.dry is None and self.step >= self.replay_steps
+        trial = self.tune_speed(node, direction, speed) if tuning else speed
+        while True:
+            if trial != self.speed_setting:
+                yield from self._set_pump_speed(trial)
+            yield from move(steps)
+            if not tuning or self.status[0].code not in OVERLOAD_CODE:
+                break
+            # back off to the last good speed, or a step below a speed that overloaded before
+            speed = speed if trial > speed else trial/self.auto_tune_step
+            if self.speed_to_hz(speed) < 40:
+                raise Exception(f'OVERLOAD: {node} {direction} overloads the syringe at the minimum speed')
+            self.logger.warning(f'{node} {direction}: syringe overload at {round(trial, 2)} ml/min, backing off to {round(speed, 2)} ml/min')
+            self.learn_speed(node, direction, speed, overload=trial)
+            trial = speed
+        if tuning and trial > speed:
+            self.learn_speed(node, direction, trial)
+        return
+
+    def _restore_speed(self):
+        if self.speed_setting != self.DEFAULT_SPEED:
+            yield from self._set_pump_speed(self.DEFAULT_SPEED)
+        return
+
+    def compilable(self, from_port, to_port):
+        '''
+            True if moving between the ports only switches the pump's own valve: the valves
+            past the pump valve agree wherever both port addresses use them
+        '''
+        return all(a == b for a, b in zip(from_port[1:], to_port[1:]))
+
+    def _compiled_strokes(self, from_port, to_port, strokes, top_steps, bottom_steps=0, aspirate_speed=None, dispense_speed=None):
+        '''
+            runs the strokes of a route as one firmware loop on the pump. the downstream valves are
+            positioned once, then valve - aspirate - valve - dispense repeats on the pump
+            (g...G loop) without host round trips, completion is verified once at the end
+        '''
+        if self.step + 2*strokes <= self.replay_steps:
+            for stroke in range(2*strokes):
+                self.skip_step() # the whole loop is committed already, see resume()
+            return
+        if self.verbose: print(f'{self.tstamp()}    {strokes} strokes compiled into one command string')
+        # downstream valves of the sink are positioned together with the source route
+        yield from self._actuate_valves(from_port + to_port[len(from_port):])
+
+        source_pos = int(from_port[0])
+        sink_pos = int(to_port[0])
+        to_sink = '-'*self.is_counter(source_pos, sink_pos, self.vtypes[0])
+        to_source = '-'*self.is_counter(sink_pos, source_pos, self.vtypes[0])
+        aspirate_speed = aspirate_speed if aspirate_speed else self.DEFAULT_SPEED
+        dispense_speed = dispense_speed if dispense_speed else self.DEFAULT_SPEED
+        aspirate_hz = self.speed_to_hz(aspirate_speed)
+        dispense_hz = self.speed_to_hz(dispense_speed)
+        # speeds change within the loop, so both strokes set theirs
+        changes_speed = (aspirate_speed, dispense_speed) != (self.DEFAULT_SPEED, self.DEFAULT_SPEED)
+        aspirate = f'V{aspirate_hz}' if changes_speed else ''
+        dispense = f'V{dispense_hz}' if changes_speed else ''
+        reset = f'V{self.speed_to_hz(self.DEFAULT_SPEED)}' if changes_speed else ''
+        packet = f'/1go{to_source}{source_pos}{aspirate}A{top_steps}o{to_sink}{sink_pos}{dispense}A{bottom_steps}G{strokes}{reset}R\r'
+        self.logger.debug(packet)
+        if self.journal is not None:
+            # the progress of the firmware loop is not observable, resume() can only redo it as a whole
+            self.journal.append({'event': 'compiled', 'operation': self.operation, 'strokes': strokes})
+        span = self.instrumentation.start('compiled strokes', device=0)
+        self.instrumentation.count('strokes', strokes)
+        self.vtree[0].write(bytes(packet, 'utf-8'))
+        if reset:
+            self.speed_setting = self.DEFAULT_SPEED
+
+        # plunger travel plus an allowance for the two valve switches per stroke, padded once
+        steps = top_steps - bottom_steps
+        pump_sleep_duration = strokes*(steps/aspirate_hz + steps/dispense_hz + 1) + 3
+        yield from self._wait_ready(0, 'compiled strokes', pump_sleep_duration, strokes*(steps/aspirate_hz + steps/dispense_hz))
+        self.instrumentation.end(span)
+        self.vstate[0] = sink_pos
+        if self.status[0].code not in OVERLOAD_CODE:
+            # the fluid path model and the journal follow the loop stroke by stroke
+            for stroke in range(strokes):
+                volume = (top_steps - self.plunger)*self.SYRINGE_VOL/MAX_STEPS
+                self.follow_fluid(from_port, volume)
+                self.plunger = top_steps
+                self.journal_step(from_port, volume)
+                self.follow_fluid(to_port, -steps*self.SYRINGE_VOL/MAX_STEPS)
+                self.plunger = bottom_steps
+                self.journal_step(to_port, -steps*self.SYRINGE_VOL/MAX_STEPS)
+        return
+
+    def _aliquot(self, source, sink_volumes):
+        ''' 
+            single aspirate, multiple dispense: the syringe is filled with as much of the
+            sink_volumes ({sink: volume}) total as fits in one stroke, then dispensed stepwise
+            to each sink by relative plunger position. refills only when the syringe runs out
+        '''
+        self.logger.info(f'aliquot: {sum(sink_volumes.values())} ml liquid from {source} to {sink_volumes}')
+        if self.verbose: print(f'{self.tstamp()} aliquot: {sum(sink_volumes.values())} ml liquid from {source} to {len(sink_volumes)} sinks')
+
+        # retrieve port adresses from port map
+        from_port = self.port_map[source]
+        # sinks below the syringe resolution are left out, they would cost a refill and valve moves for nothing
+        queue = [[sink, steps] for sink, steps in ((sink, int(MAX_STEPS*volume/self.SYRINGE_VOL)) for sink, volume in sink_volumes.items())
+                 if steps > 0]
+        remaining_steps = sum(steps for sink, steps in queue)
+        position = 0 # plunger position in steps
+
+        while queue:
+            if position == 0:
+                # ACTUATE VALVES TO INPUT
+                yield from self._actuate_valves(from_port)
+                # ASPIRATE as much as fits
+                position = min(remaining_steps, MAX_STEPS)
+                if self.verbose: print(f'{self.tstamp()}    fill {round(position*self.SYRINGE_VOL/MAX_STEPS, 2)}ml')
+                yield from self._profiled_move(source, 'aspirate', position, self._aspirate_pump)
+                speed = self.liquid_speed(source, 'dispense')
+                if speed != self.speed_setting:
+                    yield from self._set_pump_speed(speed)
+
+            sink, steps = queue[0]
+            dispense_steps = min(steps, position)
+            if self.verbose: print(f'{self.tstamp()}    {round(dispense_steps*self.SYRINGE_VOL/MAX_STEPS, 2)}ml to {sink}')
+            # ACTUATE VALVES TO OUTPUT
+            yield from self._actuate_valves(self.port_map[sink])
+            # DISPENSE to the remaining position
+            yield from self._relative_dispense_pump(position, position - dispense_steps)
+            position -= dispense_steps
+            remaining_steps -= dispense_steps
+            queue[0][1] -= dispense_steps
+            if queue[0][1] == 0:
+                queue.pop(0)
+        yield from self._restore_speed()
+        return
+
+    @contextmanager
+    def dry_run(self):
+        '''
+            operations called inside the context run the same logic without touching the serial
+            ports and without sleeping. time accumulates on a virtual clock from the sleep formulas
+            (expected device times in poll mode) and is broken down per operation in the DryRun:
+                with k0.dry_run() as estimate:
+                    k0.move_liquid('water', 'reactor1', 5)
+                estimate.total, estimate.operations
+            valve, syringe and journal step state are restored afterwards, dry runs nest (purge_plan() runs one inside)
+        '''
+        estimate = DryRun()
+        saved = {key: getattr(self, key) for key in ('clock', 'vtree', 'readers', 'instrumentation', 'logger',
+                                                     'verbose', 'vstate', 'status', 'speed_setting', 'fluid', 'plunger', 'journal', 'dry',
+                                                     'step', 'replay_steps')}
+        self.clock = VirtualClock()
+        self.vtree = [NullPort(self.clock, getattr(v, 'timeout', 0.1)) for v in saved['vtree']]
+        self.readers = [FrameReader(v) for v in self.vtree]
+        self.instrumentation = Instrumentation(self.clock, [estimate], sink_depth=0, summarize=False)
+        self.logger = logging.getLogger(f'{__name__}.dry_run')
+        self.logger.setLevel(logging.WARNING)
+        self.verbose = False
+        self.vstate = list(self.vstate)
+        self.status = list(self.status)
+        self.fluid = self.fluid.copy()
+        self.journal = None
+        self.replay_steps = 0 # the pump moves resume() skips belong to the real run
+        self.dry = estimate
+        try:
+            yield estimate
+        finally:
+            for key, value in saved.items():
+                setattr(self, key, value)
+
+    def plan(self, free_nodes=('waste',)):
+        '''
+            returns a Plan recording move_liquid, slow_dispense and partial_dispense calls
+            to be optimized and executed together, see planner.py
+        '''
+        return Plan(self, free_nodes)
+
+    def campaign(self, path, **settings):
+        '''
+            returns a Campaign streaming the experiment design table at path (csv or parquet),
+            see campaign.py
+        '''
+        return Campaign(self, path, **settings)
+
+    def stop_pump(self):
+        '''
+            terminates the commands running on all devices and marks the valve positions unknown,
+            sent when an operation is cancelled or interrupted
+        '''
+        for v in self.vtree:
+            v.write(b'/1TR\r')
+        self.invalidate_valve_state()
+        self.logger.warning('operation cancelled, devices stopped')
+        if self.verbose: print(f'{self.tstamp()} operation cancelled, devices stopped')
+        return
+
+    # JOURNAL
+    def begin_operation(self, name, fields):
+        '''
+            journals the start of a top-level operation, returns True if resume() found it finished already.
+            an interrupted operation skips the pump moves it committed before the crash
+        '''
+        self.step = 0
+        self.replay_steps = 0
+        if self.journal is None:
+            return False
+        if not self.session:
+            self.journal.append({'event': 'session', 'time': self.clock.time()})
+            self.session = True
+        self.operation += 1
+        fields = json.loads(json.dumps(fields))
+        past = self.replay.get(self.operation)
+        if past is None:
+            self.journal.append({'event': 'operation', 'operation': self.operation, 'name': name, 'fields': fields})
+            return False
+        if (past['name'], past['fields']) != (name, fields):
+            raise Exception(f"RESUME: operation {self.operation} is {name} {fields}, the journal has {past['name']} {past['fields']}")
+        if past['done']:
+            self.logger.info(f'resume: operation {self.operation} {name} finished already')
+            return True
+        if past['compiled']:
+            raise Exception(f'RESUME: operation {self.operation} {name} was interrupted in a compiled stroke loop, '
+                            f'the strokes done are unknown')
+        self.replay_steps = len(past['steps'])
+        self.logger.info(f'resume: operation {self.operation} {name} continues after pump move {self.replay_steps}')
+        if self.verbose: print(f'{self.tstamp()} resuming {name} after pump move {self.replay_steps}')
+        return False
+
+    def end_operation(self):
+        if self.journal is not None:
+            self.journal.append({'event': 'done', 'operation': self.operation})
+        return
+
+    def journal_step(self, route, volume):
+        self.step += 1
+        if self.journal is not None:
+            self.journal.append({'event': 'step', 'operation': self.operation, 'step': self.step, 'route': route,
+                                 'volume': volume, 'vstate': self.vstate, 'plunger': self.plunger})
+        return
+
+    def skip_step(self):
+        '''
+            True for the pump moves of the interrupted operation the journal has as committed,
+            their valve state, plunger position and fluid path are restored instead of repeating them
+        '''
+        if self.dry is not None or self.step >= self.replay_steps:
+            return False
+        record = self.replay[self.operation]['steps'][self.step]
+        self.follow_fluid(record['route'], record['volume'])
+        self.vstate = list(record['vstate'])
+        self.plunger = record['plunger']
+        self.step += 1
+        return True
+
+    def resume(self, journal_path=None):
+        '''
+            picks up a run that died mid-campaign (STALL, usb drop, kernel restart) without initializing again:
+            valve state, plunger position and the fluid path model are rebuilt from the journal, then the
+            same procedure is run again - finished operations are skipped and the interrupted one continues
+            from its first incomplete pump move
+        '''
+        journal_path = journal_path or self.config.get('journal')
+        if journal_path is None:
+            raise Exception('No journal to resume from, set journal in config.yaml')
+        self.replay = journaled_operations(read_session(journal_path))
+        if self.journal is None:
+            self.journal = Journal(journal_path)
+        self.session = True # the resumed run continues the journaled session
+        self.operation = 0
+        # state up to the interrupted operation, its own pump moves are restored as they are skipped
+        self.fluid = self.fluid_path()
+        for index, past in sorted(self.replay.items()):
+            if not past['done']:
+                break
+            for record in past['steps']:
+                self.follow_fluid(record['route'], record['volume'])
+                self.vstate = list(record['vstate'])
+                self.plunger = record['plunger']
+        finished = sum(past['done'] for past in self.replay.values())
+        self.logger.info(f'resume: {finished} of {len(self.replay)} journaled operations finished, vstate {self.vstate}, plunger {self.plunger}')
+        if self.verbose: print(f'{self.tstamp()} resume: {finished} of {len(self.replay)} journaled operations finished')
+        # the pump speed at the time of the crash is unknown
+        self.run(self._set_pump_speed(self.DEFAULT_SPEED))
+        return
+
+    def run(self, steps, name=None, fields=None):
+        '''
+            drives an operation generator with blocking sleeps and reads, interrupting stops the pump.
+            named operations are recorded as instrumentation spans and in the journal
+        '''
+        if self.dry is not None and name in DRY_CACHED and self.fluid_moves is None:
+            return self.run_cached(steps, name, fields or {})
+        if name and self.begin_operation(name, fields or {}):
+            steps.close()
+            return None
+        span = self.instrumentation.start(name, **(fields or {})) if name else None
+        error = None
+        try:
+            request = next(steps)
+            while True:
+                if isinstance(request, (int, float)):
+                    self.clock.sleep(request)
+                    request = steps.send(None)
+                    continue
+                start = self.clock.monotonic()
+                if isinstance(request, FrameReader):
+                    response = request.read_frame()
+                else:
+                    response = request.readlines()
+                self.instrumentation.wire(self.clock.monotonic() - start)
+                request = steps.send(response)
+        except StopIteration as done:
+            if name:
+                self.end_operation()
+            return done.value
+        except KeyboardInterrupt as interrupt:
+            error = repr(interrupt)
+            steps.close()
+            self.stop_pump()
+            raise
+        except Exception as exception:
+            error = repr(exception)
+            raise
+        finally:
+            if span is not None:
+                self.instrumentation.end(span, error)
+
+    def run_cached(self, steps, name, fields):
+        '''
+            dry runs of large designs repeat the same transfers from the same valve state. the first run of
+            a transfer records its time, wire/busy split, counts, plunger moves and end state, repeats replay
+            them on the virtual clock and the fluid path model without driving the generators
+        '''
+        key = (name, tuple(sorted(fields.items())), tuple(self.vstate), self.speed_setting, self.plunger)
+        cost = self.dry.costs.get(key)
+        if cost is None:
+            instrumentation = self.instrumentation
+            start, wire, busy, counts = self.clock.monotonic(), instrumentation.wire_total, instrumentation.busy_total, dict(instrumentation.counts)
+            self.fluid_moves = []
+            try:
+                self.run(steps, name, fields)
+                self.dry.costs[key] = {'seconds': self.clock.monotonic() - start,
+                                       'wire': instrumentation.wire_total - wire,
+                                       'busy': instrumentation.busy_total - busy,
+                                       'counts': {count: n - counts.get(count, 0) for count, n in instrumentation.counts.items()
+                                                  if n != counts.get(count, 0)},
+                                       'fluid': self.fluid_moves,
+                                       'vstate': list(self.vstate), 'speed_setting': self.speed_setting,
+                                       'plunger': self.plunger, 'status': list(self.status)}
+            finally:
+                self.fluid_moves = None
+            return None
+        steps.close()
+        span = self.instrumentation.start(name, **fields)
+        self.clock.sleep(cost['seconds'])
+        self.instrumentation.wire(cost['wire'])
+        self.instrumentation.busy(cost['busy'])
+        for count, n in cost['counts'].items():
+            self.instrumentation.count(count, n)
+        for route, volume in cost['fluid']:
+            self.follow_fluid(route, volume)
+        self.step += len(cost['fluid'])
+        self.vstate = list(cost['vstate'])
+        self.speed_setting = cost['speed_setting']
+        self.plunger = cost['plunger']
+        self.status = list(cost['status'])
+        self.instrumentation.end(span)
+        return None
+
+    async def arun(self, steps, name=None, fields=None):
+        '''
+            drives an operation generator with asyncio sleeps and non-blocking reads,
+            cancelling the task stops the pump
+        '''
+        if name and self.begin_operation(name, fields or {}):
+            steps.close()
+            return None
+        span = self.instrumentation.start(name, **(fields or {})) if name else None
+        error = None
+        try:
+            request = next(steps)
+            while True:
+                if isinstance(request, (int, float)):
+                    await self.asleep(request)
+                    request = steps.send(None)
+                    continue
+                start = self.clock.monotonic()
+                if isinstance(request, FrameReader):
+                    response = await request.aread_frame(self.asleep, self.clock)
+                else:
+                    response = await self.areadlines(request)
+                self.instrumentation.wire(self.clock.monotonic() - start)
+                request = steps.send(response)
+        except StopIteration as done:
+            if name:
+                self.end_operation()
+            return done.value
+        except asyncio.CancelledError as cancel:
+            error = repr(cancel)
+            steps.close()
+            self.stop_pump()
+            raise
+        except Exception as exception:
+            error = repr(exception)
+            raise
+        finally:
+            if span is not None:
+                self.instrumentation.end(span, error)
+
+    async def asleep(self, seconds):
+        if hasattr(self.clock, 'asleep'):
+            await self.clock.asleep(seconds)
+        else:
+            await asyncio.sleep(seconds)
+        return
+
+    async def areadlines(self, port, interval=0.005):
+        '''
+            non-blocking port.readlines(): collects data until the port stays quiet for its read timeout
+        '''
+        timeout = getattr(port, 'timeout', 0.1)
+        data = b''
+        quiet_since = self.clock.monotonic()
+        while self.clock.monotonic() - quiet_since < timeout:
+            waiting = port.in_waiting
+            if waiting:
+                data += port.read(waiting)
+                quiet_since = self.clock.monotonic()
+            await self.asleep(interval)
+        return data.splitlines(keepends=True)
+
+    # SYNCHRONOUS API
+    set_pump_speed = blocking(_set_pump_speed)
+    actuate_valves = blocking(_actuate_valves)
+    aspirate_pump = blocking(_aspirate_pump)
+    dispense_pump = blocking(_dispense_pump)
+    relative_aspirate_pump = blocking(_relative_aspirate_pump)
+    relative_dispense_pump = blocking(_relative_dispense_pump)
+    interrogate_state = blocking(_interrogate_state)
+    wait_ready = blocking(_wait_ready)
+    initialize_daisy_chain = blocking(_initialize_daisy_chain)
+    warm_start = blocking(_warm_start)
+    move_liquid = blocking(_move_liquid)
+    compose = blocking(_compose)
+    slow_dispense = blocking(_slow_dispense)
+    continuous_flow = blocking(_continuous_flow)
+    partial_dispense = blocking(_partial_dispense)
+    fill_syringe = blocking(_fill_syringe)
+    empty_syringe = blocking(_empty_syringe)
+    aliquot = blocking(_aliquot)
+    ensure_primed = blocking(_ensure_primed)
+    ensure_clean = blocking(_ensure_clean)
 
+    # ASYNCIO API, e.g. await k0.amove_liquid('water', 'reactor1', 1)
+    ainterrogate_state = awaitable(_interrogate_state)
+    ainitialize_daisy_chain = awaitable(_initialize_daisy_chain)
+    awarm_start = awaitable(_warm_start)
+    amove_liquid = awaitable(_move_liquid)
+    acompose = awaitable(_compose)
+    aslow_dispense = awaitable(_slow_dispense)
+    acontinuous_flow = awaitable(_continuous_flow)
+    apartial_dispense = awaitable(_partial_dispense)
+    afill_syringe = awaitable(_fill_syringe)
+    aempty_syringe = awaitable(_empty_syringe)
+    aaliquot = awaitable(_aliquot)
+    aensure_primed = awaitable(_ensure_primed)
+    aensure_clean = awaitable(_ensure_clean)
 
     # TODO: do a self test, to run at the least when initiating    
     def self_check():
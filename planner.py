@@ -0,0 +1,209 @@
+# procedure planner: records liquid operations, reorders and merges them within the ordering
+# constraints and executes them on the daisy chain.
+# usage:
+#   plan = k0.plan()
+#   plan.move_liquid('nahco3', 'waste', 0.5, 4)
+#   plan.move_liquid('nahco3', 'reactor1', 2)
+#   plan.barrier() # nothing is reordered across a barrier
+#   plan.move_liquid('water', 'reactor1', 1)
+#   plan.optimize() # reports the predicted time saved
+#   plan.commit()
+#
+# ordering constraints: every route shares the syringe and the links between the valves, so a run of
+# consecutive operations from the same source (e.g. its prime to waste and the deliveries after it) is
+# kept together as one block that no other source enters. blocks sharing a node keep their authoring
+# order, except for the free nodes (waste by default) where order does not matter. a block moving only
+# to free nodes (a purge or wash) keeps its place between the blocks around it, and operations never
+# cross a barrier.
+
+
+class Plan:
+
+    def __init__(self, chain, free_nodes=('waste',)):
+        self.chain = chain
+        self.free_nodes = set(free_nodes)
+        self.operations = []
+        self.planned = None
+        self.segment = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.commit()
+        return False
+
+    # RECORDING
+    def _record(self, kind, source, sink, volume, times, **settings):
+        for node in (source, sink):
+            if node not in self.chain.port_map:
+                raise Exception(f'Node {node} not added to port_map.yaml configuration file!')
+        op = {'kind': kind, 'source': source, 'sink': sink, 'volume': volume, 'times': times,
+              'index': len(self.operations), 'segment': self.segment}
+        op.update(settings)
+        self.operations.append(op)
+        self.planned = None
+        return
+
+    def move_liquid(self, source, sink, volume, times=1):
+        self._record('move_liquid', source, sink, volume, times)
+        return
+
+    def slow_dispense(self, source, sink, volume, dispense_speed, times=1):
+        self._record('slow_dispense', source, sink, volume, times, dispense_speed=dispense_speed)
+        return
+
+    def partial_dispense(self, source, sink, volume, offset, aspirate_speed, dispense_speed, times=1):
+        self._record('partial_dispense', source, sink, volume, times, offset=offset,
+                     aspirate_speed=aspirate_speed, dispense_speed=dispense_speed)
+        return
+
+    def barrier(self):
+        '''
+            operations recorded after the barrier are never moved before it
+        '''
+        self.segment += 1
+        return
+
+    # COST MODEL
+    def valve_moves(self, port_address, vstate):
+        moves = []
+        for x, y in enumerate(port_address):
+            if self.chain.differential_valves and vstate[x] == int(y):
+                continue
+            moves.append((x, int(y)))
+        return moves
+
+    def travel(self, port_address, vstate):
+        # (valves to move, positions rotated) from vstate to the port address
+        moves = self.valve_moves(port_address, vstate)
+        rotation = sum(self.chain.valve_travel(vstate[x], y, self.chain.vtypes[x]) for x, y in moves)
+        return len(moves), rotation
+
+    def estimate(self, operations, vstate=None):
+        '''
+            predicted duration from a dry run of the chain methods,
+            returns (seconds, strokes, valve switches)
+        '''
+        with self.chain.dry_run() as estimate:
+            if vstate is not None:
+                self.chain.vstate = list(vstate)
+            self.execute(operations)
+        return estimate.total, estimate.count('strokes'), estimate.count('valve_switches')
+
+    # OPTIMIZATION
+    def nodes(self, ops):
+        return {node for op in ops for node in (op['source'], op['sink'])} - self.free_nodes
+
+    def blocks(self, segment):
+        # runs of consecutive operations from the same source
+        blocks = []
+        for op in segment:
+            if blocks and blocks[-1][-1]['source'] == op['source']:
+                blocks[-1].append(op)
+            else:
+                blocks.append([op])
+        return blocks
+
+    def order(self, segment):
+        '''
+            greedy ordering of the source blocks: among the blocks whose predecessors are done, prefer the
+            current source (no re-priming), then the fewest valve moves and rotated positions
+        '''
+        blocks = self.blocks(segment)
+        nodes = [self.nodes(block) for block in blocks]
+        purges = [all(op['sink'] in self.free_nodes for op in block) for block in blocks]
+        depends = {x: {y for y in range(x) if purges[x] or purges[y] or nodes[x] & nodes[y]}
+                   for x in range(len(blocks))}
+        remaining = list(range(len(blocks)))
+        done = set()
+        ordered = []
+        vstate = list(self.chain.vstate)
+        last_source = None
+        while remaining:
+            ready = [x for x in remaining if depends[x] <= done]
+            best = min(ready, key=lambda x: (blocks[x][0]['source'] != last_source,
+                                              self.travel(self.chain.port_map[blocks[x][0]['source']], vstate),
+                                              x))
+            remaining.remove(best)
+            done.add(best)
+            ordered += blocks[best]
+            last_source = blocks[best][0]['source']
+            for op in blocks[best]:
+                for port in (self.chain.port_map[op['source']], self.chain.port_map[op['sink']]):
+                    for x, y in enumerate(port):
+                        vstate[x] = int(y)
+        return ordered
+
+    def mergeable(self, a, b):
+        if a['kind'] != b['kind'] or a['kind'] == 'partial_dispense':
+            return False
+        if a['times'] != 1 or b['times'] != 1:
+            return False
+        return (a['source'], a['sink'], a.get('dispense_speed')) == (b['source'], b['sink'], b.get('dispense_speed'))
+
+    def merge(self, ordered):
+        '''
+            consecutive single moves along the same route become one move split into full syringe strokes
+        '''
+        merged = []
+        for op in ordered:
+            if merged and self.mergeable(merged[-1], op):
+                merged[-1] = dict(merged[-1], volume=merged[-1]['volume'] + op['volume'])
+                continue
+            merged.append(dict(op))
+        return merged
+
+    def optimize(self):
+        planned = []
+        for segment in sorted({op['segment'] for op in self.operations}):
+            ops = [op for op in self.operations if op['segment'] == segment]
+            planned += self.merge(self.order(ops))
+        self.planned = planned
+
+        seconds, strokes, switches = self.estimate(self.operations)
+        planned_seconds, planned_strokes, planned_switches = self.estimate(planned)
+        report = {'operations': len(self.operations),
+                  'planned_operations': len(planned),
+                  'strokes': strokes,
+                  'planned_strokes': planned_strokes,
+                  'valve_switches': switches,
+                  'planned_valve_switches': planned_switches,
+                  'predicted_time': round(seconds, 1),
+                  'planned_time': round(planned_seconds, 1),
+                  'time_saved': round(seconds - planned_seconds, 1)}
+        self.chain.logger.info(f'plan: {report}')
+        if self.chain.verbose:
+            print(f'{self.chain.tstamp()} plan: {len(self.operations)} -> {len(planned)} operations, '
+                  f'{strokes} -> {planned_strokes} strokes, {switches} -> {planned_switches} valve switches, '
+                  f'predicted {round(seconds/60, 1)} -> {round(planned_seconds/60, 1)} min')
+        return report
+
+    # EXECUTION
+    def commit(self, optimize=True):
+        '''
+            executes the planned operations, in authoring order if optimize is False
+        '''
+        if not optimize:
+            operations = self.operations
+        else:
+            if self.planned is None:
+                self.optimize()
+            operations = self.planned
+        self.execute(operations)
+        self.operations = []
+        self.planned = None
+        self.segment = 0
+        return
+
+    def execute(self, operations):
+        for op in operations:
+            if op['kind'] == 'move_liquid':
+                self.chain.move_liquid(op['source'], op['sink'], op['volume'], op['times'])
+            elif op['kind'] == 'slow_dispense':
+                self.chain.slow_dispense(op['source'], op['sink'], op['volume'], op['dispense_speed'], op['times'])
+            else:
+                self.chain.partial_dispense(op['source'], op['sink'], op['volume'], op['offset'],
+                                            op['aspirate_speed'], op['dispense_speed'], op['times'])
+        return
@@ -0,0 +1,130 @@
+import asyncio
+from kemchi import DaisyChain
+
+# multi-chain job scheduler: one queue of liquid operations over the combined port namespace of
+# several daisy chains. every operation goes to an idle chain that reaches all of its nodes, the
+# chains run as parallel asyncio tasks.
+# usage:
+#   sched = ChainScheduler.from_configs([('pm_a.yaml', 'config_a.yaml'), ('pm_b.yaml', 'config_b.yaml')])
+#   sched.move_liquid('toluene', 'reactor1', 10)
+#   sched.move_liquid('water', 'reactor7', 5)
+#   sched.run() # or await sched.arun() inside a running event loop (jupyter)
+#
+# operations adding to a node keep their queue order with every other operation using that node,
+# across chains (a reactor reachable from two chains is only ever handled by one at a time).
+# stocks that are only drawn from and free nodes like waste are not ordered.
+
+
+class ChainScheduler:
+
+    def __init__(self, chains, free_nodes=('waste',)):
+        self.chains = list(chains)
+        self.free_nodes = set(free_nodes)
+        self.queue = []
+
+    @classmethod
+    def from_configs(cls, config_paths, free_nodes=('waste',), **chain_settings):
+        '''
+            builds the chains from (port_map_path, config_path) pairs
+        '''
+        chains = [DaisyChain(port_map_path, config_path, **chain_settings) for port_map_path, config_path in config_paths]
+        return cls(chains, free_nodes)
+
+    @property
+    def port_map(self):
+        # combined namespace, node -> indices of the chains reaching it
+        nodes = {}
+        for x, chain in enumerate(self.chains):
+            for node in chain.port_map:
+                nodes.setdefault(node, []).append(x)
+        return nodes
+
+    # QUEUEING
+    def _queue(self, kind, sources, sinks, *args):
+        nodes = sources + sinks
+        capable = [x for x, chain in enumerate(self.chains) if all(node in chain.port_map for node in nodes)]
+        if not capable:
+            raise Exception(f'No daisy chain reaches all of {nodes}, check the port_map.yaml files')
+        self.queue.append({'kind': kind, 'sources': set(sources), 'sinks': set(sinks), 'args': args, 'chains': capable,
+                           'index': len(self.queue)})
+        return
+
+    def move_liquid(self, source, sink, volume, times=1):
+        self._queue('move_liquid', [source], [sink], source, sink, volume, times)
+        return
+
+    def slow_dispense(self, source, sink, volume, dispense_speed, times=1):
+        self._queue('slow_dispense', [source], [sink], source, sink, volume, dispense_speed, times)
+        return
+
+    def partial_dispense(self, source, sink, volume, offset, aspirate_speed, dispense_speed, times=1):
+        self._queue('partial_dispense', [source], [sink], source, sink, volume, offset, aspirate_speed, dispense_speed, times)
+        return
+
+    def aliquot(self, source, sink_volumes):
+        self._queue('aliquot', [source], list(sink_volumes), source, sink_volumes)
+        return
+
+    # DISPATCHING
+    def conflict(self, a, b):
+        # a node written by one of the operations and used by the other
+        a_sinks = a['sinks'] - self.free_nodes
+        b_sinks = b['sinks'] - self.free_nodes
+        return bool(a_sinks & (b['sources'] | b['sinks']) or b_sinks & a['sources'])
+
+    def ready(self, op, pending):
+        # every earlier conflicting operation has to be finished
+        return not any(prev['index'] < op['index'] and self.conflict(prev, op) for prev in pending)
+
+    async def arun(self):
+        '''
+            runs the queue on all chains in parallel, returns a report with the busy time per chain
+        '''
+        pending = list(self.queue)
+        self.queue = []
+        running = {} # task -> (chain index, operation)
+        clock = self.chains[0].clock
+        start = clock.monotonic()
+        busy = [0.0 for chain in self.chains]
+        done = [0 for chain in self.chains]
+        try:
+            while pending or running:
+                idle = [x for x in range(len(self.chains)) if x not in [x for x, op in running.values()]]
+                for op in [op for op in pending if op not in [op for x, op in running.values()]]:
+                    candidates = [x for x in op['chains'] if x in idle]
+                    if not candidates or not self.ready(op, pending):
+                        continue
+                    x = candidates[0]
+                    idle.remove(x)
+                    task = asyncio.ensure_future(self.execute(x, op))
+                    running[task] = (x, op)
+                finished, _ = await asyncio.wait(list(running), return_when=asyncio.FIRST_COMPLETED)
+                for task in finished:
+                    x, op = running.pop(task)
+                    pending.remove(op)
+                    duration = task.result() # raises the errors of the operation
+                    busy[x] += duration
+                    done[x] += 1
+        except BaseException:
+            for task in running:
+                task.cancel() # stops the pumps of the other chains
+            await asyncio.gather(*running, return_exceptions=True)
+            raise
+        makespan = clock.monotonic() - start
+        report = {'makespan': makespan,
+                  'operations': done,
+                  'busy_time': busy,
+                  'utilization': [b/makespan if makespan else 0.0 for b in busy]}
+        return report
+
+    async def execute(self, x, op):
+        chain = self.chains[x]
+        start = chain.clock.monotonic()
+        await getattr(chain, 'a' + op['kind'])(*op['args'])
+        return chain.clock.monotonic() - start
+
+    def run(self):
+        '''
+            blocking run of the queue, inside a running event loop (jupyter) use await arun()
+        '''
+        return asyncio.run(self.arun())
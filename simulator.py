@@ -0,0 +1,424 @@
+import re
+import heapq
+import asyncio
+import itertools
+import yaml
+from constants import MAX_STEPS, WARNING_CODE, CRITICAL_CODE
+
+# hardware simulator for the daisy chain: a kloehn pump with its own distribution valve on the
+# first port and plain distribution valves on the rest, driven through a virtual clock.
+# usage:
+#   rig = SimulatedRig('config_files/config.yaml')
+#   k0 = kemchi.DaisyChain('config_files/port_map.yaml', 'config_files/config.yaml',
+#                          transport=rig.open_port, clock=rig.clock)
+
+
+class VirtualClock:
+    '''
+        fast-forward clock, sleeping only advances the simulated time.
+        asleep() runs concurrent asyncio tasks as a discrete event simulation: the clock moves to
+        the earliest wake-up time once every task is waiting, so parallel chains overlap in time
+    '''
+    def __init__(self, start=0.0, settle=5):
+        self.now = start
+        self.slept = 0.0
+        self.settle = settle # event loop passes letting woken tasks reach their next sleep
+        self.timers = []
+        self.counter = itertools.count()
+        self.advancer = None
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            self.now += seconds
+            self.slept += seconds
+        return
+
+    async def asleep(self, seconds):
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.timers, (self.now + max(seconds, 0), next(self.counter), future))
+        if self.advancer is None or self.advancer.done():
+            self.advancer = asyncio.ensure_future(self.advance())
+        await future
+        return
+
+    async def advance(self):
+        while self.timers:
+            for _ in range(self.settle):
+                await asyncio.sleep(0)
+            wake, _, future = heapq.heappop(self.timers)
+            self.now = max(self.now, wake)
+            if not future.done(): # cancelled sleepers are skipped
+                future.set_result(None)
+        return
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+
+class NullPort:
+    '''
+        stand-in port for dry runs: swallows writes and answers every read with a ready frame.
+        reads take the time the real port would, readlines() waits out the read timeout
+    '''
+    ready_frame = b"/0'\x03\r\n"
+    in_waiting = 0
+
+    def __init__(self, clock, timeout=0.1, latency=0.015):
+        self.clock = clock
+        self.timeout = timeout
+        self.latency = latency # s, command and reply on the wire plus device turnaround
+
+    def write(self, data):
+        return len(data)
+
+    def readlines(self):
+        self.clock.sleep(self.timeout)
+        return [self.ready_frame]
+
+    def read_until(self, expected=b'\n', size=None):
+        self.clock.sleep(self.latency)
+        return self.ready_frame
+
+    def read(self, size=1):
+        return b''
+
+
+class SimulatedDevice:
+    '''
+        port-like object (write, readline, readlines, read_until) emulating one device of the chain.
+        parses /1...R packets, /1Q and the /1? (plunger) and /1?6 (valve) position queries, models valve
+        rotation and plunger travel time and replies to every packet with a /0<status>\\x03\\r\\n frame
+        using the codes from constants.py, queries answer /0<status><position>\\x03\\r\\n
+    '''
+    command_pattern = re.compile(r'([A-Za-z])(-?\d*)')
+
+    def __init__(self,
+                 clock,
+                 vtype,
+                 has_pump=False,
+                 port=None,
+                 timeout=0.1, # s, read timeout of the serial port
+                 baudrate=9600,
+                 latency=0.005, # s, device turnaround before a reply is sent
+                 valve_time=0.2, # s, valve start/stop overhead
+                 valve_step_time=0.1, # s per position rotated
+                 init_time=3.0, # s, homing the plunger
+                 speed_hz=5000 # factory default
+                 ):
+        self.clock = clock
+        self.vtype = vtype
+        self.has_pump = has_pump
+        self.port = port
+        self.timeout = timeout
+        self.baudrate = baudrate
+        self.latency = latency
+        self.valve_time = valve_time
+        self.valve_step_time = valve_step_time
+        self.init_time = init_time
+        self.speed_hz = speed_hz
+        self.valve_pos = 1
+        self.plunger = 0
+        self.initialized = not has_pump
+        self.busy_until = 0.0
+        self.move = None # (start, origin, target, end) of the last plunger move
+        self.pending = 0.0
+        self.error = None
+        self.sticky = False
+        self.faults = [] # [commands left before the fault, code, sticky]
+        self.out = [] # [arrival time, frame]
+        self.packets = 0
+        self.rejected = 0
+        self.rotations = 0
+        self.strokes = 0
+        self.speed_limit = None # callable returning the plunger speed in Hz above which the syringe overloads
+
+    # FAULT INJECTION
+    def inject_fault(self, code, after=0, sticky=False):
+        '''
+            the fault code is reported after *after* more packets are executed.
+            sticky faults stay until reset(), others clear on the next accepted command
+        '''
+        if code not in WARNING_CODE and code not in CRITICAL_CODE:
+            raise Exception(f'{code} is not a known status code')
+        self.faults.append([after, code, sticky])
+        return
+
+    def power_cycle(self):
+        '''
+            the device lost power: the plunger has to be homed again, a valve reports device not initialized
+        '''
+        self.reset()
+        self.initialized = False
+        return
+
+    def reset(self):
+        self.error = None
+        self.sticky = False
+        self.faults = []
+        self.busy_until = self.clock.monotonic()
+        return
+
+    # STATE
+    def busy(self, at=None):
+        return (self.clock.monotonic() if at is None else at) < self.busy_until
+
+    def status(self, at):
+        busy = self.busy(at)
+        if self.error is not None:
+            code = self.error[0:1]
+            return code.upper() if busy else code.lower()
+        if not self.initialized and self.has_pump:
+            return b'A' if busy else b'a'
+        if not self.initialized:
+            return b'G' if busy else b'g'
+        return b'@' if busy else b"'"
+
+    def wire_time(self, data):
+        return len(data)*10/self.baudrate # 8N1 framing
+
+    # PORT INTERFACE
+    def write(self, data):
+        self.packets += 1
+        arrival = self.clock.monotonic() + self.wire_time(data)
+        packet = data.decode('utf-8', 'replace').strip()
+        if packet.startswith('/1') and packet[2:] == 'Q':
+            self._reply(arrival)
+            return len(data)
+        if packet.startswith('/1?'):
+            self._reply(arrival, data=self.query(packet[3:]))
+            return len(data)
+        if not (packet.startswith('/1') and packet.endswith('R')):
+            self.error = b'b'
+            self._reply(arrival)
+            return len(data)
+        if packet[2:-1] == 'T':
+            self.terminate(arrival)
+            self._reply(arrival)
+            return len(data)
+        if self.busy(arrival):
+            self.rejected += 1
+            self._reply(arrival, b'O') # command buffer full, busy
+            return len(data)
+        if not self.sticky:
+            self.error = None
+        duration = self.execute(packet[2:-1])
+        self.busy_until = arrival + duration
+        self._trigger_faults()
+        self._reply(arrival)
+        return len(data)
+
+    def query(self, report):
+        # position report, plunger steps for /1? and the valve position for /1?6
+        if report == '' and self.has_pump:
+            return str(self.plunger).encode()
+        if report == '6':
+            return str(self.valve_pos).encode()
+        self.error = b'c'
+        return b''
+
+    def _reply(self, at, code=None, data=b''):
+        if code is None:
+            code = self.status(at)
+        frame = b'/0' + code + data + b'\x03\r\n'
+        self.out.append([at + self.latency + self.wire_time(frame), frame])
+        return
+
+    def _trigger_faults(self):
+        for fault in list(self.faults):
+            if fault[0] > 0:
+                fault[0] -= 1
+                continue
+            self.faults.remove(fault)
+            self.error = fault[1]
+            self.sticky = fault[2]
+        return
+
+    def _ready_frames(self, until):
+        frames = [frame for at, frame in self.out if at <= until]
+        self.out = [[at, frame] for at, frame in self.out if at > until]
+        return frames
+
+    def readlines(self):
+        # pyserial readlines returns only after the read timeout expires without new data
+        now = self.clock.monotonic()
+        last = max([at for at, frame in self.out if at <= now + self.timeout], default=now)
+        self.clock.sleep(max(last - now, 0) + self.timeout)
+        return self._ready_frames(self.clock.monotonic())
+
+    def read_until(self, expected=b'\n', size=None):
+        now = self.clock.monotonic()
+        if not self.out or self.out[0][0] > now + self.timeout:
+            self.clock.sleep(self.timeout)
+            return b''
+        at, frame = self.out.pop(0)
+        self.clock.sleep(max(at - now, 0))
+        return frame
+
+    def readline(self):
+        return self.read_until(b'\n')
+
+    def read(self, size=1):
+        frames = self._ready_frames(self.clock.monotonic())
+        return b''.join(frames)
+
+    @property
+    def in_waiting(self):
+        now = self.clock.monotonic()
+        return sum(len(frame) for at, frame in self.out if at <= now)
+
+    def reset_input_buffer(self):
+        self.out = []
+        return
+
+    def close(self):
+        return
+
+    def terminate(self, at):
+        # stops the plunger where it is at the time of the terminate command
+        if self.busy(at) and self.move is not None:
+            start, origin, target, end = self.move
+            if end > start and at < end:
+                self.plunger = int(origin + (target - origin)*(at - start)/(end - start))
+        self.busy_until = at
+        self.move = None
+        return
+
+    # COMMAND EXECUTION
+    def execute(self, body):
+        '''
+            runs a command string and returns the time the device stays busy
+        '''
+        self.pending = 0.0 # time until the current command of the string starts
+        commands = self.command_pattern.findall(body)
+        x = 0
+        loop_start = None
+        loops_left = None
+        while x < len(commands):
+            command, operand = commands[x]
+            x += 1
+            if command == 'g':
+                if loop_start is not None:
+                    self.error = b'q' # loops nested too deep
+                    break
+                loop_start = x
+                continue
+            if command == 'G':
+                if loop_start is None:
+                    continue
+                if loops_left is None:
+                    loops_left = int(operand) if operand else 1
+                loops_left -= 1
+                if loops_left > 0:
+                    x = loop_start
+                else:
+                    loop_start = None
+                    loops_left = None
+                continue
+            result = self.execute_command(command, operand)
+            if result is None:
+                break
+            self.pending += result
+        return self.pending
+
+    def execute_command(self, command, operand):
+        # returns the command duration, None stops the command string on error
+        if command == 'o':
+            pos = abs(int(operand)) if operand.lstrip('-') else 0
+            if not 0 < pos <= self.vtype:
+                self.error = b'c'
+                return None
+            if not self.has_pump:
+                self.initialized = True # the valve homes on its first move
+            if pos == self.valve_pos:
+                return 0.0
+            if operand.startswith('-'):
+                distance = (self.valve_pos - pos) % self.vtype
+            else:
+                distance = (pos - self.valve_pos) % self.vtype
+            self.valve_pos = pos
+            self.rotations += 1
+            return self.valve_time + distance*self.valve_step_time
+        if not self.has_pump:
+            self.error = b'b'
+            return None
+        if command == 'V':
+            if not operand or not 40 <= int(operand) <= 10000:
+                self.error = b'c'
+                return None
+            self.speed_hz = int(operand)
+            return 0.0
+        if command == 'W':
+            self.initialized = True
+            self.plunger = 0
+            return self.init_time
+        if command == 'A':
+            if not self.initialized:
+                self.error = b'g'
+                return None
+            target = int(operand) if operand else 0
+            if not 0 <= target <= MAX_STEPS:
+                self.error = b'c'
+                return None
+            distance = abs(target - self.plunger)
+            limit = self.speed_limit() if self.speed_limit is not None else None
+            if distance and limit is not None and self.speed_hz > limit:
+                self.error = b'i' # the plunger stalls without moving
+                return None
+            start = self.clock.monotonic() + self.pending
+            self.move = (start, self.plunger, target, start + distance/self.speed_hz)
+            self.plunger = target
+            self.strokes += 1
+            return distance/self.speed_hz
+        self.error = b'b'
+        return None
+
+
+class SimulatedRig:
+    '''
+        builds one simulated device per com port of a config file, the first one carries the pump
+    '''
+    def __init__(self, config_path, clock=None, **device_settings):
+        with open(config_path, 'r') as file:
+            self.config = yaml.safe_load(file)
+        self.clock = clock if clock is not None else VirtualClock()
+        self.devices = {}
+        for x, (com_port, vtype) in enumerate(zip(self.config['com_ports'], self.config['valve_types'])):
+            self.devices[com_port] = SimulatedDevice(self.clock, vtype, has_pump=(x == 0), port=com_port, **device_settings)
+        self.overload_speeds = {} # port address -> plunger speed in Hz above which the syringe overloads
+        self.pump.speed_limit = self.route_speed_limit
+
+    def open_port(self, com_port):
+        return self.devices[com_port]
+
+    @property
+    def pump(self):
+        return self.devices[self.config['com_ports'][0]]
+
+    def set_overload_speed(self, port_address, speed_hz):
+        '''
+            viscous liquid at the port address: faster plunger moves report a syringe overload
+        '''
+        self.overload_speeds[str(port_address)] = speed_hz
+        return
+
+    def route(self):
+        # port address the pump is connected to, position 1 leads on to the next valve
+        address = ''
+        for device in self.devices.values():
+            address += str(device.valve_pos)
+            if device.valve_pos != 1:
+                break
+        return address
+
+    def route_speed_limit(self):
+        return self.overload_speeds.get(self.route())
+
+    def stats(self):
+        return {'simulated_time': self.clock.monotonic(),
+                'packets': sum(d.packets for d in self.devices.values()),
+                'valve_rotations': sum(d.rotations for d in self.devices.values()),
+                'strokes': self.pump.strokes,
+                'rejected': sum(d.rejected for d in self.devices.values())}
@@ -0,0 +1,54 @@
+import os
+import sys
+import yaml
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT) # the modules live flat in the repository root
+
+import kemchi
+import simulator
+
+PORT_MAP = os.path.join(ROOT, 'examples', 'config_files', 'port_map.yaml')
+CONFIG = os.path.join(ROOT, 'examples', 'config_files', 'config.yaml')
+
+
+@pytest.fixture
+def settings():
+    # config.yaml overrides, test modules redefine this fixture
+    return {}
+
+@pytest.fixture
+def config_path(tmp_path, monkeypatch, settings):
+    # DaisyChain logs to logs/ of the working directory
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('logs')
+    if not settings:
+        return CONFIG
+    with open(CONFIG, 'r') as file:
+        config = yaml.safe_load(file)
+    config.update(settings)
+    with open('config.yaml', 'w') as file:
+        yaml.safe_dump(config, file)
+    return str(tmp_path/'config.yaml')
+
+@pytest.fixture
+def rig(config_path):
+    return simulator.SimulatedRig(config_path)
+
+@pytest.fixture
+def chain(rig, config_path):
+    k = kemchi.DaisyChain(PORT_MAP, config_path, verbose=False, transport=rig.open_port, clock=rig.clock)
+    k.initialize_daisy_chain()
+    return k
+
+@pytest.fixture
+def pump_packets(rig):
+    # command strings written to the pump
+    packets = []
+    write = rig.pump.write
+    def record(data):
+        packets.append(data.decode())
+        return write(data)
+    rig.pump.write = record
+    return packets
@@ -0,0 +1,11 @@
+def commands(packets):
+    # pump commands other than status interrogations
+    return [packet for packet in packets if packet != '/1Q\r']
+
+def test_refill_within_a_sink(chain, rig, pump_packets):
+    # reactor1 empties most of the first fill, nacl gets the rest and is finished after a refill,
+    # nahco3 is below one plunger step
+    chain.aliquot('water', {'reactor1': 6, 'nacl': 6, 'nahco3': 0.0001})
+    assert commands(pump_packets) == ['/1o2R\r', '/1A24000R\r', '/1o-1R\r', '/1A9600R\r', '/1A0R\r',
+                                      '/1o2R\r', '/1A4800R\r', '/1o-1R\r', '/1A0R\r']
+    assert rig.pump.plunger == 0 and chain.plunger == 0
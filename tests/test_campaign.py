@@ -0,0 +1,18 @@
+import pytest
+
+
+def design(path, rows):
+    path.write_text('reactor,water_1,nacl_1\n' + ''.join(f'{reactor},{water},{nacl}\n' for reactor, water, nacl in rows))
+    return str(path)
+
+def test_capacity_counts_every_row_of_a_reactor(chain, tmp_path):
+    # reactor1 holds 20 ml, every row fits but the three rows together do not
+    path = design(tmp_path/'design.csv', [('reactor1', 5, 3), ('sampler', 1, 0), ('reactor1', 5, 3), ('reactor1', 4, 1)])
+    with pytest.raises(Exception, match='row 3: reactor1 filled over its 20 ml capacity, 21.0 ml'):
+        chain.campaign(path, chunk_rows=2).validate()
+
+def test_capacity_within_limit(chain, tmp_path):
+    path = design(tmp_path/'design.csv', [('reactor1', 5, 3), ('sampler', 1, 0), ('reactor1', 5, 3)])
+    report = chain.campaign(path, chunk_rows=2).validate()
+    assert report['rows'] == 3
+    assert report['volumes'] == {'water': 11.0, 'nacl': 6.0}
@@ -0,0 +1,47 @@
+import pytest
+
+
+@pytest.fixture
+def settings():
+    return {'compile_strokes': True}
+
+def commands(packets):
+    # pump commands other than status interrogations
+    return [packet for packet in packets if packet != '/1Q\r']
+
+def test_move_liquid_dispenses_to_zero(chain, rig, pump_packets):
+    chain.move_liquid('water', 'waste', 0.5, 4)
+    assert commands(pump_packets)[-1] == '/1go2A1200o-1A0G4R\r'
+    assert rig.pump.plunger == 0 and chain.plunger == 0
+
+def test_slow_dispense_speeds(chain, rig, pump_packets):
+    chain.slow_dispense('water', 'waste', 2, 5)
+    aspirate, dispense, default = (chain.speed_to_hz(speed) for speed in (chain.DEFAULT_SPEED, 5, chain.DEFAULT_SPEED))
+    assert commands(pump_packets)[-1] == f'/1go2V{aspirate}A4800o-1V{dispense}A0G1V{default}R\r'
+    assert rig.pump.plunger == 0
+
+def test_move_liquid_splits_into_looped_strokes(chain, rig, pump_packets):
+    strokes = rig.pump.strokes
+    chain.move_liquid('water', 'waste', 25)
+    assert commands(pump_packets)[-1] == '/1go2A20000o-1A0G3R\r'
+    assert rig.pump.strokes - strokes == 2*3
+    assert rig.pump.plunger == 0 and chain.plunger == 0
+
+def test_slow_dispense_delivers_every_stroke(chain, rig):
+    strokes = rig.pump.strokes
+    chain.slow_dispense('water', 'waste', 2, 5)
+    assert rig.pump.strokes - strokes == 2
+
+def test_partial_dispense_repeats(chain, rig, pump_packets):
+    strokes = rig.pump.strokes
+    chain.partial_dispense('water', 'waste', 0.5, 0, 20, 10, times=3)
+    aspirate, dispense, default = (chain.speed_to_hz(speed) for speed in (20, 10, chain.DEFAULT_SPEED))
+    assert commands(pump_packets)[-1] == f'/1go2V{aspirate}A1200o-1V{dispense}A0G3V{default}R\r'
+    assert rig.pump.strokes - strokes == 2*3
+    assert rig.pump.plunger == 0 and chain.plunger == 0
+
+def test_partial_dispense_returns_to_the_offset(chain, rig, pump_packets):
+    chain.partial_dispense('water', 'waste', 0.5, 0.25, 20, 10)
+    aspirate, dispense, default = (chain.speed_to_hz(speed) for speed in (20, 10, chain.DEFAULT_SPEED))
+    assert commands(pump_packets)[-1] == f'/1go2V{aspirate}A1800o-1V{dispense}A600G1V{default}R\r'
+    assert rig.pump.plunger == 600 and chain.plunger == 600
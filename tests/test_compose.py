@@ -0,0 +1,23 @@
+import pytest
+
+
+def test_air_gaps_separate_neighbouring_reagents(chain):
+    strokes = chain.compose_strokes([('water', 0.5), ('nahco3', 1.0), ('nacl', 0.3)], air_gap=0.1)
+    assert strokes == [[('water', 1200), ('air', 240), ('nahco3', 2400), ('air', 240), ('nacl', 720)]]
+
+def test_reagent_that_does_not_fit_starts_a_new_stroke(chain):
+    strokes = chain.compose_strokes([('water', 6), ('nacl', 5)], air_gap=0.1)
+    # no air gap leads a stroke
+    assert strokes == [[('water', 14400)], [('nacl', 12000)]]
+
+def test_reagent_larger_than_the_syringe_is_split(chain):
+    strokes = chain.compose_strokes([('nacl', 2), ('water', 25)])
+    assert strokes == [[('nacl', 4800)], [('water', 24000)], [('water', 24000)], [('water', 12000)]]
+
+@pytest.mark.parametrize('sink, recipe', [
+    ('reactor1', [('water', 0.5), ('nahco3', 1.0), ('nacl', 0.3)]),
+    ('waste', [('nacl', 2), ('water', 25)]),
+])
+def test_compose_dispenses_to_zero(chain, rig, sink, recipe):
+    chain.compose(sink, recipe, air_gap=0.1)
+    assert rig.pump.plunger == 0 and chain.plunger == 0
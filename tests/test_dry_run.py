@@ -0,0 +1,37 @@
+import pytest
+import kemchi
+import benchmark
+
+
+def test_dry_run_predicts_the_simulated_rig(chain, rig):
+    start = rig.stats()
+    with chain.dry_run() as estimate:
+        benchmark.sample_reactors(chain)
+    assert rig.stats() == start # nothing went over the wire
+    benchmark.sample_reactors(chain)
+    simulated = rig.stats()['simulated_time'] - start['simulated_time']
+    assert abs(estimate.total - simulated) < 0.05*simulated
+    # the rig counts every plunger move, a stroke is an aspirate and a dispense
+    assert 2*estimate.count('strokes') == rig.stats()['strokes'] - start['strokes']
+
+def test_replayed_transfers_match_the_driven_ones(chain, monkeypatch):
+    def estimate():
+        with chain.dry_run() as estimate:
+            for reactor in ('reactor1', 'sampler', 'reactor1', 'sampler'):
+                benchmark.load_chemicals_to_reactors(chain, (reactor, 'sampler'))
+                benchmark.partial_dispense(chain)
+                benchmark.slow_dispense(chain)
+            contents = (chain.fluid.copy().segments, dict(chain.fluid.syringe))
+            state = (list(chain.vstate), chain.plunger, chain.speed_setting)
+        return estimate, contents, state
+    replayed, contents, state = estimate()
+    assert any(key[0] == 'partial_dispense' for key in replayed.costs)
+    monkeypatch.setattr(kemchi, 'DRY_CACHED', ())
+    driven, driven_contents, driven_state = estimate()
+    assert not driven.costs
+    assert replayed.total == pytest.approx(driven.total)
+    for name in ('strokes', 'valve_switches', 'valve_travel'):
+        assert replayed.count(name) == driven.count(name)
+    assert (contents, state) == (driven_contents, driven_state)
+    assert [(op['name'], op['wire'], op['busy']) for op in replayed.operations] == \
+        [(op['name'], pytest.approx(op['wire']), pytest.approx(op['busy'])) for op in driven.operations]
@@ -0,0 +1,34 @@
+import warnings
+
+
+def test_primed_through_shared_pump_link(chain, rig):
+    # link1 lies on both the nacl and the waste route, every purge stroke only dilutes it
+    chain.move_liquid('nacl', 'waste', 0.5, 4)
+    chain.move_liquid('water', 'sampler', 2)
+    segments = chain.fluid.path(chain.port_map['nacl'])
+    assert 'link1' in segments and 'link1' in chain.fluid.path(chain.port_map['waste'])
+    start = rig.stats()
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        chain.ensure_primed('nacl')
+    assert chain.fluid.impurity(segments, ['nacl']) <= chain.purity
+    assert chain.fluid.contamination(['nacl']) <= chain.purity
+    # fewer plunger moves than the defensive move_liquid('nacl', 'waste', 0.5, 4)
+    assert rig.stats()['strokes'] - start['strokes'] < 8
+
+def test_primed_node_is_not_purged_again(chain, rig):
+    chain.ensure_primed('nacl')
+    start = rig.stats()
+    chain.ensure_primed('nacl')
+    assert rig.stats()['strokes'] == start['strokes']
+
+def test_purge_plan_inside_dry_run(chain, rig):
+    # purge_plan() dry runs its candidates, the surrounding dry run carries on after it
+    chain.move_liquid('water', 'sampler', 2)
+    start = rig.stats()
+    with chain.dry_run() as estimate:
+        chain.ensure_primed('nacl')
+        assert chain.dry is estimate
+        chain.move_liquid('nacl', 'reactor1', 1)
+    assert rig.stats() == start
+    assert [op['name'] for op in estimate.operations] == ['ensure_primed', 'move_liquid']
@@ -0,0 +1,11 @@
+import benchmark
+
+
+def test_device_time_within_elapsed(chain):
+    # valves move one at a time within the default power budget, the devices never overlap
+    chain.instrumentation.reset()
+    benchmark.sample_reactors(chain)
+    summary = chain.instrumentation.summary()
+    device_time = sum(total['duration'] for total in summary['device'].values())
+    assert summary['device']['v0']['duration'] < summary['elapsed']
+    assert device_time <= summary['elapsed']
@@ -0,0 +1,68 @@
+import pytest
+import kemchi
+from conftest import PORT_MAP
+from journal import read_session, journaled_operations
+
+# procedures as (operation, arguments), the stall is injected into the last operation
+MULTI_STROKE = [('move_liquid', ('water', 'sampler', 2)), ('move_liquid', ('water', 'reactor1', 25))] # 3 strokes
+# the pump valve link is shared with the waste route, nacl is purged in several strokes
+PRIMED = [('move_liquid', ('water', 'sampler', 2)), ('ensure_primed', ('nacl',))]
+
+
+@pytest.fixture
+def settings(tmp_path):
+    return {'journal': str(tmp_path/'journal.jsonl')}
+
+def run_procedure(k, procedure):
+    for name, args in procedure:
+        getattr(k, name)(*args)
+
+def plunger_moves(packets):
+    return [packet for packet in packets if packet.startswith('/1A')]
+
+def run_until_stall(chain, rig, procedure, move):
+    # the pump stalls on the move-th plunger move of the procedure: the move runs, the interrogation after it
+    # reports a possible crash. the command index of the move is counted in a dry run of the procedure
+    sent = []
+    with chain.dry_run():
+        write = chain.vtree[0].write
+        chain.vtree[0].write = lambda data: sent.append(data.decode()) or write(data)
+        run_procedure(chain, procedure)
+    commands = [packet for packet in sent if packet != '/1Q\r']
+    after = [x for x, packet in enumerate(commands) if packet.startswith('/1A')][move - 1]
+    rig.pump.inject_fault(b'z', after=after)
+    with pytest.raises(Exception, match='STALL'), pytest.warns(UserWarning, match='Syringe may crash'):
+        run_procedure(chain, procedure)
+    rig.clock.sleep(60) # kernel restart, the stalled move has finished
+    return len(plunger_moves(commands))
+
+def resumed_chain(rig, config_path):
+    k = kemchi.DaisyChain(PORT_MAP, config_path, verbose=False, transport=rig.open_port, clock=rig.clock)
+    k.resume()
+    return k
+
+@pytest.mark.parametrize('procedure, move', [(MULTI_STROKE, 2 + 3), (PRIMED, 2 + 5)])
+def test_resume_after_stall(chain, rig, config_path, pump_packets, procedure, move):
+    total = run_until_stall(chain, rig, procedure, move)
+    k = resumed_chain(rig, config_path)
+    start = rig.stats()
+    k.initialize_daisy_chain()
+    run_procedure(k, procedure[:-1])
+    assert rig.stats() == start # finished operations send nothing
+    sent = len(pump_packets)
+    run_procedure(k, procedure[-1:])
+    # the moves before the stalled one are not repeated
+    assert len(plunger_moves(pump_packets[sent:])) == total - (move - 1)
+    assert rig.pump.plunger == 0 and k.plunger == 0
+    # the interrupted operation continues its step count, every plunger move is journaled once
+    operation = journaled_operations(read_session(k.config['journal']))[3] # after initialize and the transfer
+    assert operation['done']
+    assert [record['step'] for record in operation['steps']] == list(range(1, total - 2 + 1))
+
+def test_resumed_ensure_primed_is_clean(chain, rig, config_path):
+    run_until_stall(chain, rig, PRIMED, 2 + 5)
+    k = resumed_chain(rig, config_path)
+    k.initialize_daisy_chain()
+    run_procedure(k, PRIMED)
+    assert k.fluid.impurity(k.fluid.path(k.port_map['nacl']), ['nacl']) <= k.purity
+    assert k.fluid.contamination(['nacl']) <= k.purity
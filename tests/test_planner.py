@@ -0,0 +1,38 @@
+import benchmark
+
+
+def routes(operations):
+    return [(op['source'], op['sink']) for op in operations]
+
+
+def test_load_chemicals_keeps_prime_before_deliveries(chain):
+    plan = chain.plan()
+    benchmark.load_chemicals_to_reactors(plan)
+    authored = routes(plan.operations)
+    plan.optimize()
+    assert routes(plan.planned) == authored
+
+def test_sample_reactors_keeps_wash_order(chain):
+    plan = chain.plan()
+    benchmark.sample_reactors(plan)
+    authored = routes(plan.operations)
+    plan.optimize()
+    assert routes(plan.planned) == authored
+
+def test_purge_stays_between_its_neighbours(chain):
+    plan = chain.plan()
+    plan.move_liquid('nahco3', 'reactor1', 1)
+    plan.move_liquid('water', 'waste', 1)
+    plan.move_liquid('nacl', 'sampler', 1)
+    plan.optimize()
+    assert routes(plan.planned) == [('nahco3', 'reactor1'), ('water', 'waste'), ('nacl', 'sampler')]
+
+def test_independent_blocks_are_grouped_by_source(chain):
+    plan = chain.plan()
+    plan.move_liquid('water', 'reactor1', 1)
+    plan.move_liquid('nacl', 'sampler', 1)
+    plan.move_liquid('water', 'reactor1', 1)
+    report = plan.optimize()
+    assert routes(plan.planned) == [('water', 'reactor1'), ('nacl', 'sampler')]
+    assert plan.planned[0]['volume'] == 2
+    assert report['planned_strokes'] < report['strokes']
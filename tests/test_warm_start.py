@@ -0,0 +1,52 @@
+import pytest
+import kemchi
+from conftest import PORT_MAP
+
+
+@pytest.fixture
+def rig_packets(rig):
+    # command strings written to each device, by chain position
+    packets = []
+    for x, device in enumerate(rig.devices.values()):
+        packets.append([])
+        def record(data, write=device.write, sent=packets[x]):
+            sent.append(data.decode())
+            return write(data)
+        device.write = record
+    return packets
+
+@pytest.fixture
+def restarted(chain, rig, config_path):
+    # leaves the first and last valve off their home position and the plunger at the offset, then reconnects like a new kernel
+    chain.partial_dispense('reactor1', 'nahco3', 0.5, 0.25, 20, 10)
+    def reconnect():
+        k = kemchi.DaisyChain(PORT_MAP, config_path, verbose=False, transport=rig.open_port, clock=rig.clock)
+        k.warm_start()
+        return k
+    return reconnect
+
+def homed(packets):
+    return [packet for packet in packets if packet in ('/1o1R\r', '/1W4R\r')]
+
+def test_initialized_rig_is_read_back(chain, rig, restarted, rig_packets):
+    k = restarted()
+    assert not any(homed(packets) for packets in rig_packets)
+    assert k.vstate == chain.vstate == [3, 1, 4]
+    assert k.plunger == chain.plunger == rig.pump.plunger == 600
+
+def test_power_cycled_valve_is_homed(chain, rig, restarted, rig_packets):
+    valve = list(rig.devices.values())[2]
+    valve.power_cycle()
+    k = restarted()
+    assert homed(rig_packets[2]) == ['/1o1R\r']
+    assert not homed(rig_packets[0]) and not homed(rig_packets[1])
+    assert k.vstate == chain.vstate[:2] + [1] and valve.valve_pos == 1
+    assert k.plunger == 600
+
+def test_power_cycled_pump_is_homed(chain, rig, restarted, rig_packets):
+    rig.pump.power_cycle()
+    k = restarted()
+    assert homed(rig_packets[0]) == ['/1o1R\r', '/1W4R\r']
+    assert not homed(rig_packets[1]) and not homed(rig_packets[2])
+    assert k.vstate == [1] + chain.vstate[1:]
+    assert k.plunger == rig.pump.plunger == 0 and rig.pump.initialized
@@ -0,0 +1,249 @@
+import sys
+import json
+from framing import FRAME_PATTERN, TERMINATOR, parse_status
+from simulator import SimulatedDevice, SimulatedRig
+
+# serial traffic recorder and replay profiler. with traffic_log set in config.yaml every vtree port is
+# wrapped in a RecordingPort and each written packet and received chunk is appended as one json line
+#   {"t": 12.345678, "d": 0, "tx": "/1A2400R\r"}
+#   {"t": 12.367012, "d": 0, "rx": "/0@\u0003\r\n"}
+# t is the monotonic time of the chain clock, d the vtree index, the bytes are stored as latin-1 text.
+# readlines() returns after the read timeout, so frames are timestamped exactly only with framed_status.
+# usage:
+#   python traffic.py logs/traffic.jsonl # latency profile: command to ready time per device and command
+#   rig = traffic.ReplayRig('logs/traffic.jsonl', 'config_files/config.yaml') # recorded device timings
+#   k0 = kemchi.DaisyChain('config_files/port_map.yaml', 'config_files/config.yaml', transport=rig.open_port, clock=rig.clock)
+#   ... the recorded procedure, e.g. with another poll_interval ...
+#   rig.profile(), rig.stats()
+
+
+# COMMAND TYPES
+COMMAND_KIND = {'A': 'move', 'o': 'valve', 'V': 'speed', 'W': 'init', 'g': 'loop', 'T': 'terminate'}
+
+def command_kind(packet):
+    # type of a /1...R packet or its body, 'status' for Q and 'query' for the position reports
+    body = packet.strip()
+    body = body[2:] if body.startswith('/1') else body
+    if body.startswith('Q'):
+        return 'status'
+    if body.startswith('?'):
+        return 'query'
+    return COMMAND_KIND.get(body[:1], body[:1] or 'empty')
+
+
+# RECORDING
+class RecordingPort:
+    '''
+        port wrapper logging every write and every read to the recorder, anything else goes to the port
+    '''
+    def __init__(self, port, device, recorder):
+        self.port = port
+        self.device = device
+        self.recorder = recorder
+
+    def __getattr__(self, name):
+        return getattr(self.port, name)
+
+    def write(self, data):
+        self.recorder.record(self.device, 'tx', data)
+        return self.port.write(data)
+
+    def read(self, size=1):
+        data = self.port.read(size)
+        if data:
+            self.recorder.record(self.device, 'rx', data)
+        return data
+
+    def read_until(self, expected=b'\n', size=None):
+        data = self.port.read_until(expected, size) if size is not None else self.port.read_until(expected)
+        if data:
+            self.recorder.record(self.device, 'rx', data)
+        return data
+
+    def readline(self):
+        data = self.port.readline()
+        if data:
+            self.recorder.record(self.device, 'rx', data)
+        return data
+
+    def readlines(self):
+        lines = self.port.readlines()
+        if lines:
+            self.recorder.record(self.device, 'rx', b''.join(lines))
+        return lines
+
+
+class TrafficRecorder:
+    '''
+        timestamped serial trace, appended to a json lines file or kept in memory (events) without a path
+    '''
+    def __init__(self, clock, path=None):
+        self.clock = clock
+        self.path = path
+        self.file = open(path, 'a') if path else None
+        self.events = [] if path is None else None
+
+    def wrap(self, port, device):
+        return RecordingPort(port, device, self)
+
+    def record(self, device, direction, data):
+        event = {'t': round(self.clock.monotonic(), 6), 'd': device, direction: data.decode('latin-1')}
+        if self.file is None:
+            self.events.append(event)
+            return
+        self.file.write(json.dumps(event, separators=(',', ':')) + '\n')
+        self.file.flush()
+        return
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+        return
+
+
+def read_trace(path):
+    with open(path, 'r') as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+# LATENCY PROFILE
+def command_latencies(events):
+    '''
+        (device, kind, body, ready after s, observed) of every command in the trace and (device, 'status',
+        'Q', round trip s, True) of every status interrogation. every packet is answered by one frame, in
+        order, and a command is ready at the first non-busy reply to it or to a packet sent after it. in sleep
+        mode this is only an upper bound, the device was interrogated after a fixed sleep. a command followed
+        by the next one before any ready reply is not observed, it was ready within that gap
+    '''
+    latencies = []
+    awaiting = {} # device -> [(packet number, kind, sent)] packets without reply, oldest first
+    pending = {} # device -> (packet number, kind, body, sent) of the last command not reported ready yet
+    packets = {}
+    buffers = {}
+    for event in sorted(events, key=lambda event: event['t']):
+        device = event['d']
+        if 'tx' in event:
+            kind = command_kind(event['tx'])
+            packets[device] = packets.get(device, 0) + 1
+            awaiting.setdefault(device, []).append((packets[device], kind, event['t']))
+            if kind not in ('status', 'query'):
+                # a command sent before the previous one reported ready: the device took it, so it was ready
+                if device in pending:
+                    command = pending[device]
+                    latencies.append((device, command[1], command[2], event['t'] - command[3], False))
+                pending[device] = (packets[device], kind, event['tx'].strip()[2:-1], event['t'])
+            continue
+        buffer = buffers.setdefault(device, bytearray())
+        buffer += event['rx'].encode('latin-1')
+        codes = [match.group(1) for match in FRAME_PATTERN.finditer(buffer)]
+        cut = buffer.rfind(TERMINATOR)
+        if cut >= 0:
+            del buffer[:cut + len(TERMINATOR)]
+        for code in codes:
+            if not awaiting.get(device):
+                continue # reply to a packet sent before the recording started
+            packet, kind, sent = awaiting[device].pop(0)
+            if kind == 'status':
+                latencies.append((device, 'status', 'Q', event['t'] - sent, True))
+            command = pending.get(device)
+            if command is not None and packet >= command[0] and not parse_status(code[:1]).busy:
+                latencies.append((device, command[1], command[2], event['t'] - command[3], True))
+                del pending[device]
+    return latencies
+
+def latency_profile(events):
+    '''
+        device -> command type -> count and mean, min and max command to ready time in s of the observed
+        commands, the 'status' type holds the round trips of the status interrogations
+    '''
+    profile = {}
+    for device, kind, body, ready, observed in command_latencies(events):
+        if not observed:
+            continue
+        stats = profile.setdefault(f'v{device}', {}).setdefault(kind, {'count': 0, 'mean': 0.0, 'min': ready, 'max': ready})
+        stats['count'] += 1
+        stats['mean'] += (ready - stats['mean'])/stats['count']
+        stats['min'] = min(stats['min'], ready)
+        stats['max'] = max(stats['max'], ready)
+    return profile
+
+def report_profile(profile):
+    for device, kinds in sorted(profile.items()):
+        for kind, stats in sorted(kinds.items()):
+            print(f"{device} {kind:<10}{stats['count']:>6} x  ready after {round(stats['mean'], 3)} s "
+                  f"({round(stats['min'], 3)}-{round(stats['max'], 3)})")
+    return
+
+
+# REPLAY
+class ReplayDevice(SimulatedDevice):
+    '''
+        simulated device that stays busy for the recorded command to ready time of every command. commands
+        are matched in order against the recording, unmatched ones take the recorded mean of their type,
+        or the simulator model if the type was never recorded
+    '''
+    lookahead = 5 # recorded commands skipped to find the next match
+
+    def __init__(self, clock, vtype, recorded, means, **device_settings):
+        super().__init__(clock, vtype, **device_settings)
+        self.recorded = list(recorded) # [(body, busy s)]
+        self.means = means # command type -> mean busy s
+        self.mismatches = 0
+
+    def execute(self, body):
+        modelled = super().execute(body) # valve and plunger state for the position queries
+        for x, (recorded_body, busy) in enumerate(self.recorded[:self.lookahead]):
+            if recorded_body == body:
+                del self.recorded[:x + 1]
+                return busy
+        self.mismatches += 1
+        return self.means.get(command_kind(body), modelled)
+
+
+class ReplayRig(SimulatedRig):
+    '''
+        stand-in rig built from a recorded trace: every device replies after its recorded round trip and
+        stays busy for the recorded time of each command. the replayed traffic is recorded in memory
+    '''
+    def __init__(self, trace_path, config_path, clock=None, **device_settings):
+        super().__init__(config_path, clock, **device_settings)
+        events = read_trace(trace_path)
+        latencies = command_latencies(events)
+        profile = latency_profile(events)
+        self.recorder = TrafficRecorder(self.clock)
+        for x, com_port in enumerate(self.config['com_ports']):
+            kinds = profile.get(f'v{x}', {})
+            latency = kinds.get('status', {}).get('mean', 0.005)
+            # the replies arrive after the round trip, the device stays busy for the rest
+            means = {kind: max(stats['mean'] - latency, 0.0) for kind, stats in kinds.items()}
+            recorded = []
+            for device, kind, body, ready, observed in latencies:
+                if device != x or kind == 'status':
+                    continue
+                busy = max(ready - latency, 0.0)
+                recorded.append((body, busy if observed else min(means.get(kind, 0.0), busy)))
+            device = ReplayDevice(self.clock, self.config['valve_types'][x], recorded, means, has_pump=(x == 0),
+                                  port=com_port, **device_settings)
+            # the measured round trip includes the packet and frame on the wire
+            device.latency = max(latency - device.wire_time(b"/1Q\r/0'\x03\r\n"), 0.0)
+            self.devices[com_port] = device
+        self.pump.speed_limit = self.route_speed_limit
+
+    def open_port(self, com_port):
+        return self.recorder.wrap(self.devices[com_port], self.config['com_ports'].index(com_port))
+
+    def profile(self):
+        '''
+            latency profile of the replayed traffic
+        '''
+        return latency_profile(self.recorder.events)
+
+    def stats(self):
+        return dict(super().stats(), mismatches=sum(d.mismatches for d in self.devices.values()))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2:
+        print('usage: python traffic.py <trace.jsonl>')
+        sys.exit(1)
+    report_profile(latency_profile(read_trace(sys.argv[1])))